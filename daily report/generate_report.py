@@ -3,18 +3,41 @@ Lambda function to generate daily HTML report from the data lake.
 Queries Athena for transaction data and generates an HTML summary.
 """
 import boto3
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import time
 import os
+import json
+import hashlib
+import io
+from string import Template
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_VERSION_KEY = 'inputs/_data_version.json'
+POLL_INITIAL_DELAY = 0.1
+POLL_MAX_DELAY = 2
+REPORT_UPLOAD_WORKERS = 8
+CONVERTERS = {
+    **dict.fromkeys(['tinyint', 'smallint', 'integer', 'bigint'], int),
+    **dict.fromkeys(['float', 'real', 'double', 'decimal'], float),
+    'boolean': lambda value: value == 'true',
+    'date': date.fromisoformat
+}
+
+_clients = {}
+
+
+class InvalidDateRangeError(ValueError):
+    """Raised when a requested report date range is malformed or reversed."""
 
 
 def get_aws_clients():
-    """Initialize AWS clients."""
-    return {
-        's3': boto3.client('s3'),
-        'athena': boto3.client('athena')
-    }
+    """Get AWS clients, created once per execution environment and reused while warm."""
+    if not _clients:
+        _clients.update({
+            's3': boto3.client('s3'),
+            'athena': boto3.client('athena')
+        })
+    return _clients
 
 
 def get_config():
@@ -23,58 +46,177 @@ def get_config():
     return {
         's3_bucket': s3_bucket,
         'athena_database': os.getenv('ATHENA_DATABASE', 'c21_nathan_t3_food_trucks_db'),
-        'athena_output': f's3://{s3_bucket}/athena-results/'
+        'athena_output': f's3://{s3_bucket}/athena-results/',
+        'rollup_table': os.getenv('ROLLUP_TABLE', 'rollup'),
+        'cache_prefix': os.getenv('REPORT_CACHE_PREFIX', 'cache/reports/'),
+        'cache_max_bytes': int(float(os.getenv('REPORT_CACHE_MAX_MB', 64)) * 1024 ** 2)
     }
 
 
-def run_athena_query(query, athena_client, config):
-    """Execute Athena query and return results as DataFrame."""
+def start_athena_query(query, athena_client, config):
+    """Submit a query to Athena and return its execution id."""
     response = athena_client.start_query_execution(
         QueryString=query,
         QueryExecutionContext={'Database': config['athena_database']},
         ResultConfiguration={'OutputLocation': config['athena_output']}
     )
+    return response['QueryExecutionId']
 
-    query_execution_id = response['QueryExecutionId']
 
+def wait_for_query(query_execution_id, athena_client):
+    """Poll a query with exponential backoff until it finishes.
+
+    Polling starts at 100ms so short queries return almost as soon as they
+    succeed, and backs off to 2s so long ones do not hammer the API.
+    """
+    delay = POLL_INITIAL_DELAY
     while True:
         result = athena_client.get_query_execution(
             QueryExecutionId=query_execution_id)
         state = result['QueryExecution']['Status']['State']
 
         if state == 'SUCCEEDED':
-            break
+            return
         elif state in ['FAILED', 'CANCELLED']:
             raise Exception(
                 f"Query failed: {result['QueryExecution']['Status']['StateChangeReason']}")
 
-        time.sleep(1)
-
-    results = athena_client.get_query_results(
-        QueryExecutionId=query_execution_id)
-
-    columns = [col['Label']
-               for col in results['ResultSet']['ResultSetMetadata']['ColumnInfo']]
-
-    def extract_value(field):
-        """Extract value from Athena result field."""
-        if 'VarCharValue' in field:
-            return field['VarCharValue']
-        elif 'BigIntValue' in field:
-            return field['BigIntValue']
-        elif 'IntegerValue' in field:
-            return field['IntegerValue']
-        elif 'DoubleValue' in field:
-            return field['DoubleValue']
-        elif 'BooleanValue' in field:
-            return field['BooleanValue']
-        else:
-            return ''
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+
+def fetch_query_results(query_execution_id, athena_client):
+    """Read every page of a query's results.
+
+    Returns the column names, their Athena types and the rows as lists of
+    strings, with None for nulls.
+    """
+    paginator = athena_client.get_paginator('get_query_results')
+    columns, types, rows = None, None, []
+    for page in paginator.paginate(QueryExecutionId=query_execution_id,
+                                   PaginationConfig={'PageSize': 1000}):
+        page_rows = page['ResultSet']['Rows']
+        if columns is None:
+            column_info = page['ResultSet']['ResultSetMetadata']['ColumnInfo']
+            columns = [col['Label'] for col in column_info]
+            types = [col['Type'] for col in column_info]
+            page_rows = page_rows[1:]
+        rows.extend([field.get('VarCharValue') for field in row['Data']]
+                    for row in page_rows)
+    return {'columns': columns, 'types': types, 'rows': rows}
+
+
+def to_records(results):
+    """Convert query results to a list of dicts, typing each value from its Athena column type."""
+    converters = [CONVERTERS.get(athena_type, str) for athena_type in results['types']]
+    return [{column: None if value is None else convert(value)
+             for column, convert, value in zip(results['columns'], converters, row)}
+            for row in results['rows']]
+
+
+def execute_athena_query(query, athena_client, config):
+    """Execute Athena query and return its untyped results."""
+    query_execution_id = start_athena_query(query, athena_client, config)
+    wait_for_query(query_execution_id, athena_client)
+    return fetch_query_results(query_execution_id, athena_client)
+
+
+def run_athena_query(query, athena_client, config):
+    """Execute Athena query and return results as a list of dicts."""
+    return to_records(execute_athena_query(query, athena_client, config))
+
+
+def get_data_version(s3_client, config):
+    """Get the data version published by the pipeline, or None if there is none."""
+    try:
+        response = s3_client.get_object(Bucket=config['s3_bucket'], Key=DATA_VERSION_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())['version']
+
+
+def get_cache_key(query, config, data_version):
+    """Get the result cache key of a query against the current data version."""
+    key = '\n'.join(['athena', config['athena_database'], data_version,
+                     ' '.join(query.split())])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def evict_cached_results(s3_client, config):
+    """Delete the least recently written report cache entries beyond the size bound.
+
+    The report keeps its own prefix, apart from the dashboard's Parquet
+    cache, so neither evicts the other's entries.
+    """
+    entries = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=config['s3_bucket'], Prefix=config['cache_prefix']):
+        entries.extend(page.get('Contents', []))
+    entries.sort(key=lambda obj: obj['LastModified'])
+
+    total = sum(obj['Size'] for obj in entries)
+    stale_keys = []
+    for obj in entries:
+        if total <= config['cache_max_bytes']:
+            break
+        total -= obj['Size']
+        stale_keys.append({'Key': obj['Key']})
+    for i in range(0, len(stale_keys), 1000):
+        s3_client.delete_objects(Bucket=config['s3_bucket'],
+                                 Delete={'Objects': stale_keys[i:i + 1000]})
+
 
-    rows = [[extract_value(field) for field in row['Data']]
-            for row in results['ResultSet']['Rows'][1:]]
+def run_cached_query(query, clients, config, data_version):
+    """Run an Athena query, serving it from the S3 result cache when the data is unchanged."""
+    if data_version is None:
+        return run_athena_query(query, clients['athena'], config)
 
-    return pd.DataFrame(rows, columns=columns)
+    s3_client = clients['s3']
+    cache_key = f"{config['cache_prefix']}{get_cache_key(query, config, data_version)}.json"
+    try:
+        response = s3_client.get_object(Bucket=config['s3_bucket'], Key=cache_key)
+        cached = json.loads(response['Body'].read())
+        if 'types' in cached:
+            return to_records(cached)
+    except s3_client.exceptions.NoSuchKey:
+        pass
+
+    results = execute_athena_query(query, clients['athena'], config)
+    s3_client.put_object(Bucket=config['s3_bucket'], Key=cache_key,
+                         ContentType='application/json', Body=json.dumps(results))
+    evict_cached_results(s3_client, config)
+    return to_records(results)
+
+
+def partition_bound(value, op):
+    """Build a year/month/day partition predicate for one end of a date range."""
+    year, month, day = value.strftime('%Y'), value.strftime('%m'), value.strftime('%d')
+    strict = op[0]
+    return (f"(year {strict} '{year}' OR (year = '{year}' AND "
+            f"(month {strict} '{month}' OR (month = '{month}' AND day {op} '{day}'))))")
+
+
+def build_date_predicate(start_date=None, end_date=None, date_column='transaction_date'):
+    """Build a date range predicate with matching year/month/day partition predicates.
+
+    Mirrors the builder in dashboard/queries.py, so that both prune the
+    string year, month and day partitions of the rollup the same way. The
+    Lambda image is built from this directory alone, so it keeps a copy;
+    tests/test_date_predicate.py fails if the two drift apart.
+    """
+    start = date.fromisoformat(str(start_date)) if start_date else None
+    end = date.fromisoformat(str(end_date)) if end_date else None
+
+    if start and start == end:
+        return (f"year = '{start:%Y}' AND month = '{start:%m}' AND day = '{start:%d}' "
+                f"AND {date_column} = DATE '{start.isoformat()}'")
+
+    conditions = []
+    if start:
+        conditions += [partition_bound(start, '>='), f"{date_column} >= DATE '{start.isoformat()}'"]
+    if end:
+        conditions += [partition_bound(end, '<='), f"{date_column} <= DATE '{end.isoformat()}'"]
+    return ' AND '.join(conditions)
 
 
 def get_yesterday_date():
@@ -83,178 +225,216 @@ def get_yesterday_date():
     return yesterday.strftime('%Y-%m-%d')
 
 
-def generate_report_data(athena_client, config):
-    """Query Athena for report data."""
-    report_date = get_yesterday_date()
+def build_report_query(start_date, end_date, rollup_table):
+    """Build one query returning the summary, truck and payment aggregates of every day in a range.
 
-    summary_query = f"""
-    SELECT 
-        COUNT(*) as total_transactions,
-        ROUND(SUM(CAST(total AS DOUBLE)), 2) as total_revenue,
-        ROUND(AVG(CAST(total AS DOUBLE)), 2) as avg_transaction
-    FROM transactions
-    WHERE CAST(at AS DATE) = DATE '{report_date}'
+    Each grouping set is told apart by GROUPING(truck_name, payment_method):
+    3 for the daily summary, 1 for truck rows and 2 for payment rows.
     """
-
-    trucks_query = f"""
+    return f"""
     SELECT 
+        transaction_date,
         truck_name,
-        COUNT(*) as transactions,
-        ROUND(SUM(CAST(total AS DOUBLE)), 2) as revenue
-    FROM transactions
-    WHERE CAST(at AS DATE) = DATE '{report_date}'
-    GROUP BY truck_name
-    ORDER BY revenue DESC
-    """
-
-    payment_query = f"""
-    SELECT 
         payment_method,
-        COUNT(*) as transactions,
-        ROUND(SUM(CAST(total AS DOUBLE)), 2) as revenue
-    FROM transactions
-    WHERE CAST(at AS DATE) = DATE '{report_date}'
-    GROUP BY payment_method
-    ORDER BY revenue DESC
+        GROUPING(truck_name, payment_method) as grouping_set,
+        SUM(transaction_count) as transactions,
+        ROUND(CAST(SUM(total_revenue) AS DOUBLE), 2) as revenue,
+        ROUND(CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count), 2) as avg_transaction
+    FROM {rollup_table}
+    WHERE {build_date_predicate(start_date, end_date)}
+    GROUP BY GROUPING SETS (
+        (transaction_date),
+        (transaction_date, truck_name),
+        (transaction_date, payment_method)
+    )
     """
 
-    summary = run_athena_query(summary_query, athena_client, config)
-    trucks = run_athena_query(trucks_query, athena_client, config)
-    payments = run_athena_query(payment_query, athena_client, config)
 
-    return {
+def split_report_data(rows, report_dates):
+    """Split range query rows into the report data of each date."""
+    reports = {report_date: {
         'date': report_date,
-        'summary': summary,
-        'trucks': trucks,
-        'payments': payments
-    }
+        'summary': [{'total_transactions': 0, 'total_revenue': None, 'avg_transaction': None}],
+        'trucks': [],
+        'payments': []
+    } for report_date in report_dates}
+
+    for row in rows:
+        report = reports.get(row['transaction_date'].isoformat())
+        if report is None:
+            continue
+        if row['grouping_set'] == 3:
+            report['summary'] = [{'total_transactions': row['transactions'],
+                                  'total_revenue': row['revenue'],
+                                  'avg_transaction': row['avg_transaction']}]
+        elif row['grouping_set'] == 1:
+            report['trucks'].append({key: row[key] for key in ['truck_name', 'transactions', 'revenue']})
+        else:
+            report['payments'].append({key: row[key] for key in ['payment_method', 'transactions', 'revenue']})
 
+    for report in reports.values():
+        for key in ['trucks', 'payments']:
+            report[key].sort(key=lambda row: row['revenue'] or 0, reverse=True)
+    return list(reports.values())
 
-def generate_html_report(data):
-    """Generate HTML report from data."""
-    summary = data['summary'].iloc[0]
-    report_date = data['date']
 
-    html = f"""
+def resolve_report_range(start_date=None, end_date=None):
+    """Check a report date range and return its ends in YYYY-MM-DD format.
+
+    Defaults to yesterday, and end_date to start_date. Raises
+    InvalidDateRangeError before any query runs if either date is not
+    YYYY-MM-DD or start_date is after end_date.
+    """
+    start_date = start_date or get_yesterday_date()
+    end_date = end_date or start_date
+    try:
+        start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+    except ValueError:
+        raise InvalidDateRangeError(
+            f"Dates must be YYYY-MM-DD, got {start_date!r} and {end_date!r}") from None
+    if start > end:
+        raise InvalidDateRangeError(f"start_date {start} is after end_date {end}")
+    return start.isoformat(), end.isoformat()
+
+
+def get_report_dates(start_date, end_date):
+    """Get every date from start_date to end_date inclusive in YYYY-MM-DD format."""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def generate_report_data(clients, config, start_date=None, end_date=None):
+    """Query the rollup cube in Athena for the report data of each date in a range.
+
+    Defaults to yesterday. Every day's aggregates come from a single query.
+    """
+    start_date, end_date = resolve_report_range(start_date, end_date)
+    data_version = get_data_version(clients['s3'], config)
+    query = build_report_query(start_date, end_date, config['rollup_table'])
+    rows = run_cached_query(query, clients, config, data_version)
+    return split_report_data(rows, get_report_dates(start_date, end_date))
+
+
+REPORT_HEADER = Template("""
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>T3 Food Trucks Daily Report - {report_date}</title>
+    <title>T3 Food Trucks Daily Report - $report_date</title>
     <style>
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             max-width: 1200px;
             margin: 0 auto;
             padding: 20px;
             background-color: #f5f5f5;
-        }}
-        .header {{
+        }
+        .header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 30px;
             border-radius: 10px;
             margin-bottom: 30px;
             text-align: center;
-        }}
-        .header h1 {{
+        }
+        .header h1 {
             margin: 0;
             font-size: 2.5em;
-        }}
-        .header p {{
+        }
+        .header p {
             margin: 10px 0 0 0;
             font-size: 1.2em;
             opacity: 0.9;
-        }}
-        .kpi-container {{
+        }
+        .kpi-container {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
             gap: 20px;
             margin-bottom: 30px;
-        }}
-        .kpi-card {{
+        }
+        .kpi-card {
             background: white;
             padding: 25px;
             border-radius: 10px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
             text-align: center;
-        }}
-        .kpi-value {{
+        }
+        .kpi-value {
             font-size: 2.5em;
             font-weight: bold;
             color: #667eea;
             margin: 10px 0;
-        }}
-        .kpi-label {{
+        }
+        .kpi-label {
             color: #666;
             font-size: 1.1em;
             text-transform: uppercase;
             letter-spacing: 1px;
-        }}
-        .section {{
+        }
+        .section {
             background: white;
             padding: 25px;
             border-radius: 10px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
             margin-bottom: 20px;
-        }}
-        .section h2 {{
+        }
+        .section h2 {
             color: #333;
             border-bottom: 3px solid #667eea;
             padding-bottom: 10px;
             margin-top: 0;
-        }}
-        table {{
+        }
+        table {
             width: 100%;
             border-collapse: collapse;
             margin-top: 15px;
-        }}
-        th {{
+        }
+        th {
             background-color: #667eea;
             color: white;
             padding: 12px;
             text-align: left;
             font-weight: 600;
-        }}
-        td {{
+        }
+        td {
             padding: 12px;
             border-bottom: 1px solid #e0e0e0;
-        }}
-        tr:hover {{
+        }
+        tr:hover {
             background-color: #f8f9fa;
-        }}
-        .footer {{
+        }
+        .footer {
             text-align: center;
             color: #666;
             margin-top: 30px;
             padding: 20px;
             font-size: 0.9em;
-        }}
-        .highlight {{
+        }
+        .highlight {
             color: #667eea;
             font-weight: bold;
-        }}
+        }
     </style>
 </head>
 <body>
     <div class="header">
         <h1>🚚 T3 Food Trucks</h1>
-        <p>Daily Performance Report - {report_date}</p>
+        <p>Daily Performance Report - $report_date</p>
     </div>
 
     <div class="kpi-container">
         <div class="kpi-card">
             <div class="kpi-label">Total Revenue</div>
-            <div class="kpi-value">£{summary['total_revenue']}</div>
+            <div class="kpi-value">£$total_revenue</div>
         </div>
         <div class="kpi-card">
             <div class="kpi-label">Transactions</div>
-            <div class="kpi-value">{summary['total_transactions']}</div>
+            <div class="kpi-value">$total_transactions</div>
         </div>
         <div class="kpi-card">
             <div class="kpi-label">Avg Transaction</div>
-            <div class="kpi-value">£{summary['avg_transaction']}</div>
+            <div class="kpi-value">£$avg_transaction</div>
         </div>
     </div>
 
@@ -268,19 +448,16 @@ def generate_html_report(data):
                     <th>Revenue</th>
                 </tr>
             </thead>
-            <tbody>
-"""
+            <tbody>""")
 
-    for _, row in data['trucks'].iterrows():
-        html += f"""
+TRUCK_ROW = Template("""
                 <tr>
-                    <td>{row['truck_name']}</td>
-                    <td>{row['transactions']}</td>
-                    <td class="highlight">£{row['revenue']}</td>
-                </tr>
-"""
+                    <td>$truck_name</td>
+                    <td>$transactions</td>
+                    <td class="highlight">£$revenue</td>
+                </tr>""")
 
-    html += """
+PAYMENTS_HEADER = """
             </tbody>
         </table>
     </div>
@@ -295,32 +472,51 @@ def generate_html_report(data):
                     <th>Revenue</th>
                 </tr>
             </thead>
-            <tbody>
-"""
+            <tbody>"""
 
-    for _, row in data['payments'].iterrows():
-        html += f"""
+PAYMENT_ROW = Template("""
                 <tr>
-                    <td>{row['payment_method']}</td>
-                    <td>{row['transactions']}</td>
-                    <td class="highlight">£{row['revenue']}</td>
-                </tr>
-"""
+                    <td>$payment_method</td>
+                    <td>$transactions</td>
+                    <td class="highlight">£$revenue</td>
+                </tr>""")
 
-    html += f"""
+REPORT_FOOTER = Template("""
             </tbody>
         </table>
     </div>
 
     <div class="footer">
-        <p>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}</p>
+        <p>Generated on $generated_at</p>
         <p>T3 Food Trucks Data Analytics Platform</p>
     </div>
 </body>
-</html>
-"""
+</html>""")
+
+
+def format_value(value):
+    """Format a result value for the report, showing nulls as blanks."""
+    return '' if value is None else value
+
 
-    return html
+def write_html_report(data, out):
+    """Render a report into a writable text stream with the precompiled templates."""
+    summary = {key: format_value(value) for key, value in data['summary'][0].items()}
+    out.write(REPORT_HEADER.substitute(summary, report_date=data['date']))
+    for row in data['trucks']:
+        out.write(TRUCK_ROW.substitute({key: format_value(value) for key, value in row.items()}))
+    out.write(PAYMENTS_HEADER)
+    for row in data['payments']:
+        out.write(PAYMENT_ROW.substitute({key: format_value(value) for key, value in row.items()}))
+    out.write(REPORT_FOOTER.substitute(
+        generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')))
+
+
+def generate_html_report(data):
+    """Generate HTML report from data."""
+    out = io.StringIO()
+    write_html_report(data, out)
+    return out.getvalue()
 
 
 def save_report_to_s3(html_report, report_date, s3_client, config):
@@ -338,32 +534,53 @@ def save_report_to_s3(html_report, report_date, s3_client, config):
     return s3_key
 
 
-def generate_and_save_report():
-    """Main function to generate and save daily report."""
+def render_and_save_report(data, s3_client, config):
+    """Render one day's report and save it to S3."""
+    html_report = generate_html_report(data)
+    s3_key = save_report_to_s3(html_report, data['date'], s3_client, config)
+    return {
+        'report_url': f"s3://{config['s3_bucket']}/{s3_key}",
+        'date': data['date'],
+        'html_content': html_report
+    }
+
+
+def generate_and_save_reports(start_date=None, end_date=None):
+    """Generate and save the report of each date in a range, uploading concurrently."""
+    start_date, end_date = resolve_report_range(start_date, end_date)
     clients = get_aws_clients()
     config = get_config()
 
     print("Generating daily report...")
 
-    data = generate_report_data(clients['athena'], config)
+    reports = generate_report_data(clients, config, start_date, end_date)
 
-    html_report = generate_html_report(data)
+    with ThreadPoolExecutor(max_workers=min(len(reports), REPORT_UPLOAD_WORKERS)) as executor:
+        results = list(executor.map(
+            lambda data: render_and_save_report(data, clients['s3'], config), reports))
 
-    s3_key = save_report_to_s3(
-        html_report, data['date'], clients['s3'], config)
+    for result in results:
+        print(f"✓ Report generated successfully for {result['date']}")
+    return results
 
-    print(f"✓ Report generated successfully for {data['date']}")
 
-    return {
-        'report_url': f"s3://{config['s3_bucket']}/{s3_key}",
-        'date': data['date'],
-        'html_content': html_report
-    }
+def generate_and_save_report():
+    """Main function to generate and save daily report."""
+    return generate_and_save_reports()[0]
 
 
 def lambda_handler(event, context):
     """Lambda handler function."""
     try:
+        if event and event.get('start_date'):
+            results = generate_and_save_reports(event['start_date'], event.get('end_date'))
+            return {
+                'statusCode': 200,
+                'message': f'{len(results)} reports generated successfully',
+                'report_urls': [result['report_url'] for result in results],
+                'dates': [result['date'] for result in results]
+            }
+
         result = generate_and_save_report()
 
         return {
@@ -374,6 +591,14 @@ def lambda_handler(event, context):
             'html_content': result['html_content']
         }
 
+    except InvalidDateRangeError as e:
+        print(f"Invalid report date range: {str(e)}")
+        return {
+            'statusCode': 400,
+            'message': 'Invalid report date range',
+            'error': str(e)
+        }
+
     except Exception as e:
         print(f"Error generating report: {str(e)}")
         return {
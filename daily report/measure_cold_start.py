@@ -0,0 +1,97 @@
+"""
+Cold start measurement for the report Lambda.
+Runs the handler in fresh interpreters against moto and reports module import
+time, AWS client initialisation time, and cold versus warm handler latency.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+from statistics import median
+
+RESULT_COLUMNS = ['transaction_date', 'truck_name', 'payment_method', 'grouping_set',
+                  'transactions', 'revenue', 'avg_transaction']
+RESULT_TYPES = ['date', 'varchar', 'varchar', 'integer', 'bigint', 'double', 'double']
+
+
+def queue_query_results(count, report_date):
+    """Queue moto Athena results for the report query of report_date."""
+    from moto.athena.models import QueryResults, athena_backends
+    backend = athena_backends['123456789012'][os.environ['AWS_DEFAULT_REGION']]
+    result_rows = [[report_date, None, None, '3', '120', '845.5', '7.05'],
+                   [report_date, 'Burrito Madness', None, '1', '120', '845.5', '7.05'],
+                   [report_date, None, 'card', '2', '120', '845.5', '7.05']]
+    for _ in range(count):
+        backend.query_results_queue.append(QueryResults(
+            rows=[{'Data': [{'VarCharValue': c} for c in RESULT_COLUMNS]}]
+            + [{'Data': [{} if v is None else {'VarCharValue': v} for v in row]}
+               for row in result_rows],
+            column_info=[{'Label': c, 'Name': c, 'Type': t}
+                         for c, t in zip(RESULT_COLUMNS, RESULT_TYPES)]))
+
+
+def time_call(func, *args):
+    """Wall time of a single call in seconds."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def measure_execution_environment(warm_invocations):
+    """Measure one fresh execution environment, as a Lambda cold start sees it."""
+    start = time.perf_counter()
+    import generate_report
+    import_s = time.perf_counter() - start
+    pandas_loaded = 'pandas' in sys.modules
+
+    from moto import mock_aws
+    with mock_aws():
+        import boto3
+        boto3.client('s3').create_bucket(Bucket=os.environ['S3_BUCKET_NAME'])
+        queue_query_results(warm_invocations + 1, generate_report.get_yesterday_date())
+
+        init_s = time_call(generate_report.get_aws_clients)
+        cold_s = time_call(generate_report.lambda_handler, {}, None)
+        warm_s = [time_call(generate_report.lambda_handler, {}, None)
+                  for _ in range(warm_invocations)]
+
+    return {'import_s': import_s, 'init_s': init_s, 'cold_s': cold_s,
+            'warm_s': median(warm_s), 'pandas_loaded': pandas_loaded}
+
+
+def run_measurement(runs=5, max_import_ms=None, warm_invocations=5):
+    """Measure several fresh environments and print median timings.
+
+    Exits non-zero if the median import time exceeds max_import_ms, or if
+    pandas is loaded on the handler path.
+    """
+    env = {**os.environ, 'AWS_DEFAULT_REGION': 'us-east-1',
+           'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+           'S3_BUCKET_NAME': 'cold-start-measurement'}
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, '--environment', str(warm_invocations)],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {key: median(r[key] for r in results) * 1000
+               for key in ['import_s', 'init_s', 'cold_s', 'warm_s']}
+    print(f"Report Lambda cold start over {runs} fresh environments (median ms)\n")
+    print(f"{'import':>10}{'init':>10}{'cold':>10}{'warm':>10}")
+    print(''.join(f"{summary[key]:>10.1f}" for key in ['import_s', 'init_s', 'cold_s', 'warm_s']))
+
+    if any(r['pandas_loaded'] for r in results):
+        sys.exit("✗ pandas is imported by the report handler")
+    if max_import_ms is not None and summary['import_s'] > max_import_ms:
+        sys.exit(f"✗ Import time {summary['import_s']:.1f}ms exceeds {max_import_ms}ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--environment':
+        print(json.dumps(measure_execution_environment(int(sys.argv[2]))))
+    else:
+        run_measurement(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+                        float(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -1,22 +1,189 @@
+import os
+import json
+import time
+import boto3
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import pyarrow.parquet as pq
 from pathlib import Path
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from queries import summarise_totals
+
+
+OUTPUT_NAMES = ['daily_revenue', 'truck_performance', 'payment_methods',
+                'hourly_patterns', 'day_of_week_patterns', 'rollup_totals']
+OPTIONAL_OUTPUTS = ['rollup_totals']
+
+
+def get_config():
+    """Get the outputs location, S3 refresh interval and chart size limit."""
+    load_dotenv()
+    return {
+        'outputs_dir': os.getenv('OUTPUTS_DIR', 'data/outputs'),
+        'outputs_prefix': os.getenv('OUTPUTS_S3_PREFIX'),
+        'cache_dir': os.getenv('OUTPUTS_CACHE_DIR', 'data/outputs_cache'),
+        'bucket': os.getenv('S3_BUCKET_NAME'),
+        'refresh_seconds': int(os.getenv('DASHBOARD_REFRESH_SECONDS', 60)),
+        'max_series_points': int(os.getenv('DASHBOARD_MAX_SERIES_POINTS', 365))
+    }
+
+
+def download_if_changed(s3_client, bucket, key, local_path, etag):
+    """Download an object unless its ETag still matches, returning the current ETag."""
+    conditions = {'IfNoneMatch': etag} if etag else {}
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, **conditions)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('304', 'NotModified'):
+            return etag
+        raise
+    tmp_path = local_path.with_name(f"{local_path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        for chunk in response['Body'].iter_chunks(1024 * 1024):
+            f.write(chunk)
+    os.replace(tmp_path, local_path)
+    return response['ETag']
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def sync_outputs_from_s3(bucket, prefix, cache_dir, refresh_window):
+    """Revalidate the local copies of the S3 outputs, downloading only changed files.
+
+    The refresh_window argument only keys the cache; load_data passes the
+    current DASHBOARD_REFRESH_SECONDS window, so this runs at most once per
+    window. ETags are kept next to the copies so a restarted dashboard
+    revalidates instead of downloading everything.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    etags_path = cache_dir / '_etags.json'
+    etags = json.loads(etags_path.read_text()) if etags_path.exists() else {}
+
+    s3_client = boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL'))
+    for name in OUTPUT_NAMES:
+        local_path = cache_dir / f'{name}.parquet'
+        etag = etags.get(name) if local_path.exists() else None
+        try:
+            etags[name] = download_if_changed(
+                s3_client, bucket, f'{prefix}{name}.parquet', local_path, etag)
+        except s3_client.exceptions.NoSuchKey:
+            if name not in OPTIONAL_OUTPUTS:
+                raise
+
+    etags_path.write_text(json.dumps(etags))
+    return str(cache_dir)
+
+
+def get_outputs_version(outputs_dir):
+    """Get the size and mtime of every output file, which change whenever one is rewritten."""
+    version = []
+    for name in OUTPUT_NAMES:
+        for suffix in ['parquet', 'csv']:
+            path = Path(outputs_dir) / f'{name}.{suffix}'
+            if path.exists():
+                stat = path.stat()
+                version.append((path.name, stat.st_size, stat.st_mtime_ns))
+                break
+    return tuple(version)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def read_outputs(outputs_dir, version):
+    """Read the query outputs.
+
+    The version argument only keys the cache, so outputs are re-read as soon
+    as any file changes. CSV outputs from older query runs are still read.
+    The frames are shared across sessions rather than copied per rerun, so
+    callers must not modify them.
+    """
+    data = {}
+    for name in OUTPUT_NAMES:
+        path = Path(outputs_dir) / f'{name}.parquet'
+        if path.exists():
+            data[name] = pq.read_table(path).to_pandas()
+        elif path.with_suffix('.csv').exists() or name not in OPTIONAL_OUTPUTS:
+            data[name] = pd.read_csv(path.with_suffix('.csv'))
+
+    if 'rollup_totals' in data:
+        totals = data['rollup_totals']
+        data['rollup_totals'] = totals.assign(
+            date=pd.to_datetime(totals['date']),
+            truck_name=totals['truck_name'].astype('category'),
+            payment_method=totals['payment_method'].astype('category')
+        ).sort_values('date', ignore_index=True)
+    return data
 
 
-@st.cache_data
 def load_data():
-    """Load query results from outputs folder."""
-    outputs_dir = Path('data/outputs')
+    """Load query results from the outputs folder or, if configured, from S3."""
+    config = get_config()
+    outputs_dir = config['outputs_dir']
+    if config['outputs_prefix']:
+        outputs_dir = sync_outputs_from_s3(
+            config['bucket'], config['outputs_prefix'], config['cache_dir'],
+            int(time.time() // config['refresh_seconds']))
+    return read_outputs(outputs_dir, get_outputs_version(outputs_dir))
+
+
+def get_filters(totals):
+    """Render the sidebar filters and return the selected date range, trucks and payment methods."""
+    st.sidebar.header("Filters")
+    min_date, max_date = totals['date'].min().date(), totals['date'].max().date()
+    date_range = st.sidebar.date_input("Date range", (min_date, max_date),
+                                       min_value=min_date, max_value=max_date)
     return {
-        'daily_revenue': pd.read_csv(outputs_dir / 'daily_revenue.csv'),
-        'truck_performance': pd.read_csv(outputs_dir / 'truck_performance.csv'),
-        'payment_methods': pd.read_csv(outputs_dir / 'payment_methods.csv'),
-        'hourly_patterns': pd.read_csv(outputs_dir / 'hourly_patterns.csv'),
-        'day_of_week_patterns': pd.read_csv(outputs_dir / 'day_of_week_patterns.csv')
+        'start_date': pd.Timestamp(date_range[0]),
+        'end_date': pd.Timestamp(date_range[-1]),
+        'trucks': st.sidebar.multiselect("Trucks", totals['truck_name'].cat.categories),
+        'payment_methods': st.sidebar.multiselect(
+            "Payment methods", totals['payment_method'].cat.categories)
     }
 
 
+def filter_totals(totals, filters):
+    """Select the rollup totals matching the filters; empty truck or payment selections match all.
+
+    The totals are sorted by date, so the date range is a binary-searched slice.
+    """
+    start = totals['date'].searchsorted(filters['start_date'], side='left')
+    end = totals['date'].searchsorted(filters['end_date'], side='right')
+    totals = totals.iloc[start:end]
+    if filters['trucks']:
+        totals = totals[totals['truck_name'].isin(filters['trucks'])]
+    if filters['payment_methods']:
+        totals = totals[totals['payment_method'].isin(filters['payment_methods'])]
+    return totals
+
+
+def aggregate_totals(totals):
+    """Build the dashboard results from filtered rollup totals."""
+    trucks = summarise_totals(totals, ['truck_name', 'fsa_rating', 'has_card_reader'])
+    return {
+        'daily_revenue': summarise_totals(totals, 'date'),
+        'truck_performance': trucks.rename(columns={'transaction_count': 'total_transactions'})
+                                   .sort_values('total_revenue', ascending=False),
+        'payment_methods': summarise_totals(totals, 'payment_method')
+                           .sort_values('total_revenue', ascending=False),
+        'hourly_patterns': summarise_totals(totals, 'hour_of_day'),
+        'day_of_week_patterns': summarise_totals(totals, 'day_of_week')
+    }
+
+
+def downsample_daily(daily, max_points):
+    """Average a daily series over equal-width day buckets so it has at most max_points points."""
+    dates = pd.to_datetime(daily['date'])
+    span_days = (dates.max() - dates.min()).days + 1 if len(daily) else 0
+    if span_days <= max_points:
+        return daily, 1
+
+    bucket_days = -(-span_days // max_points)
+    bucketed = daily.assign(date=dates).resample(f'{bucket_days}D', on='date')[
+        'total_revenue'].mean().dropna().reset_index()
+    return bucketed, bucket_days
+
+
 def display_kpis(data):
     """Display key performance indicator metrics."""
     col1, col2, col3, col4 = st.columns(4)
@@ -31,9 +198,13 @@ def display_kpis(data):
 
 def display_daily_revenue(data):
     """Display daily revenue trend line chart."""
-    st.subheader("Daily Revenue")
-    fig = px.line(data['daily_revenue'], x='date',
-                  y='total_revenue', markers=True)
+    daily, bucket_days = downsample_daily(data['daily_revenue'],
+                                          get_config()['max_series_points'])
+    if bucket_days > 1:
+        st.subheader(f"Daily Revenue (average per day over {bucket_days}-day periods)")
+    else:
+        st.subheader("Daily Revenue")
+    fig = px.line(daily, x='date', y='total_revenue', markers=True)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -78,6 +249,9 @@ def main():
     st.title("🚚 T3 Food Trucks Dashboard")
 
     data = load_data()
+    if 'rollup_totals' in data:
+        filters = get_filters(data['rollup_totals'])
+        data = aggregate_totals(filter_totals(data['rollup_totals'], filters))
 
     display_kpis(data)
     st.divider()
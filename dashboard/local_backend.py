@@ -0,0 +1,59 @@
+"""
+Local query backend for queries.py.
+Runs the same SQL with embedded DuckDB over the rollup Parquet partitions,
+either on local disk or on S3 (including stand-ins such as moto), with
+hive-partition pruning and column projection handled by DuckDB.
+"""
+import os
+import threading
+import duckdb
+
+_connections = {}
+_lock = threading.Lock()
+
+
+def get_connection(config):
+    """Get a DuckDB connection with the rollup table registered as a view."""
+    data_path = config['local_data_path'].rstrip('/')
+    with _lock:
+        if data_path not in _connections:
+            connection = duckdb.connect()
+            if data_path.startswith('s3://'):
+                configure_s3(connection)
+            connection.execute(f"""
+            CREATE VIEW {config['rollup_table']} AS
+            SELECT * FROM read_parquet(
+                '{data_path}/year=*/month=*/day=*/*.parquet',
+                hive_partitioning = true,
+                hive_types = {{'year': VARCHAR, 'month': VARCHAR, 'day': VARCHAR}})
+            """)
+            _connections[data_path] = connection
+        return _connections[data_path]
+
+
+def configure_s3(connection):
+    """Configure DuckDB's S3 access from the standard AWS environment variables."""
+    connection.execute("INSTALL httpfs; LOAD httpfs;")
+    connection.execute("""
+    CREATE SECRET (TYPE s3, PROVIDER credential_chain)
+    """)
+    endpoint = os.getenv('S3_ENDPOINT_URL')
+    if endpoint:
+        scheme, host = endpoint.split('://', 1)
+        connection.execute(f"SET s3_endpoint = '{host}'")
+        connection.execute(f"SET s3_use_ssl = {str(scheme == 'https').lower()}")
+        connection.execute("SET s3_url_style = 'path'")
+
+
+def run_local_query(query, config):
+    """Run a query with DuckDB and return results typed as the Athena path returns them."""
+    cursor = get_connection(config).cursor()
+    relation = cursor.sql(query)
+    df = relation.df()
+
+    for name, dtype in zip(relation.columns, relation.types):
+        if str(dtype) == 'HUGEINT':
+            df[name] = df[name].astype('Int64')
+        elif str(dtype) == 'DATE':
+            df[name] = df[name].dt.date
+    return df
@@ -1,8 +1,12 @@
 import os
+import boto3
 import awswrangler as wr
 import pandas as pd
 from pathlib import Path
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from query_cache import cached_query, get_data_version
 
 
 def get_config():
@@ -11,137 +15,293 @@ def get_config():
     return {
         'database': os.getenv('ATHENA_DATABASE', 'c21_nathan_t3_food_trucks_db'),
         'bucket': os.getenv('S3_BUCKET_NAME'),
-        's3_output': f"s3://{os.getenv('S3_BUCKET_NAME')}/athena-results/"
+        's3_output': f"s3://{os.getenv('S3_BUCKET_NAME')}/athena-results/",
+        'rollup_table': os.getenv('ROLLUP_TABLE', 'rollup'),
+        'backend': os.getenv('QUERY_BACKEND', 'athena'),
+        'local_data_path': os.getenv('LOCAL_DATA_PATH', '../pipeline/data/rollup'),
+        'start_date': os.getenv('QUERY_START_DATE'),
+        'end_date': os.getenv('QUERY_END_DATE'),
+        'outputs_prefix': os.getenv('OUTPUTS_S3_PREFIX')
     }
 
 
+def partition_bound(value, op):
+    """Build a year/month/day partition predicate for one end of a date range."""
+    year, month, day = value.strftime('%Y'), value.strftime('%m'), value.strftime('%d')
+    strict = op[0]
+    return (f"(year {strict} '{year}' OR (year = '{year}' AND "
+            f"(month {strict} '{month}' OR (month = '{month}' AND day {op} '{day}'))))")
+
+
+def build_date_predicate(start_date=None, end_date=None, date_column='transaction_date'):
+    """Build a date range predicate with matching year/month/day partition predicates.
+
+    The data is partitioned by string year, month and day columns, which a
+    filter on the date column alone cannot prune. Either end may be omitted.
+    """
+    start = date.fromisoformat(str(start_date)) if start_date else None
+    end = date.fromisoformat(str(end_date)) if end_date else None
+
+    if start and start == end:
+        return (f"year = '{start:%Y}' AND month = '{start:%m}' AND day = '{start:%d}' "
+                f"AND {date_column} = DATE '{start.isoformat()}'")
+
+    conditions = []
+    if start:
+        conditions += [partition_bound(start, '>='), f"{date_column} >= DATE '{start.isoformat()}'"]
+    if end:
+        conditions += [partition_bound(end, '<='), f"{date_column} <= DATE '{end.isoformat()}'"]
+    return ' AND '.join(conditions)
+
+
+def get_where_clause(config):
+    """Get the WHERE clause restricting a query to the configured date range."""
+    predicate = build_date_predicate(config.get('start_date'), config.get('end_date'))
+    return f"WHERE {predicate}" if predicate else ''
+
+
+def run_query(query, config):
+    """Run a query, serving it from the result cache when the data is unchanged."""
+    return cached_query(query, config, execute_query)
+
+
+def execute_query(query, config):
+    """Run a query on the configured backend and return the results as a DataFrame.
+
+    The 'local' backend runs the same SQL with DuckDB over the rollup Parquet
+    partitions instead of Athena.
+    """
+    if config['backend'] == 'local':
+        from local_backend import run_local_query
+        return run_local_query(query, config)
+    return wr.athena.read_sql_query(
+        query, database=config['database'], s3_output=config['s3_output'],
+        boto3_session=config.get('boto3_session'))
+
+
 def query_daily_revenue(config):
     """Query daily revenue totals."""
-    query = """
+    query = f"""
     SELECT 
-        DATE(at) as date,
-        COUNT(*) as transaction_count,
-        SUM(total) as total_revenue,
-        AVG(total) as avg_transaction_value
-    FROM transactions
-    GROUP BY DATE(at)
+        transaction_date as date,
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue,
+        CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count) as avg_transaction_value
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
+    GROUP BY transaction_date
     ORDER BY date
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
 def query_truck_performance(config):
     """Query performance metrics by truck."""
-    query = """
+    query = f"""
     SELECT 
         truck_name,
-        COUNT(transaction_id) as total_transactions,
-        SUM(total) as total_revenue,
-        AVG(total) as avg_transaction_value,
+        SUM(transaction_count) as total_transactions,
+        SUM(total_revenue) as total_revenue,
+        CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count) as avg_transaction_value,
         fsa_rating,
         has_card_reader
-    FROM transactions
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
     GROUP BY truck_name, fsa_rating, has_card_reader
     ORDER BY total_revenue DESC
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
 def query_payment_methods(config):
     """Query revenue by payment method."""
-    query = """
+    query = f"""
     SELECT 
         payment_method,
-        COUNT(transaction_id) as transaction_count,
-        SUM(total) as total_revenue,
-        AVG(total) as avg_transaction_value
-    FROM transactions
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue,
+        CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count) as avg_transaction_value
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
     GROUP BY payment_method
     ORDER BY total_revenue DESC
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
 def query_hourly_patterns(config):
     """Query revenue patterns by hour of day."""
-    query = """
+    query = f"""
     SELECT 
-        HOUR(at) as hour_of_day,
-        COUNT(*) as transaction_count,
-        SUM(total) as total_revenue,
-        AVG(total) as avg_transaction_value
-    FROM transactions
-    GROUP BY HOUR(at)
+        hour_of_day,
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue,
+        CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count) as avg_transaction_value
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
+    GROUP BY hour_of_day
     ORDER BY hour_of_day
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
 def query_day_of_week_patterns(config):
     """Query revenue patterns by day of week."""
-    query = """
+    query = f"""
     SELECT 
-        DAY_OF_WEEK(at) as day_of_week,
-        COUNT(*) as transaction_count,
-        SUM(total) as total_revenue,
-        AVG(total) as avg_transaction_value
-    FROM transactions
-    GROUP BY DAY_OF_WEEK(at)
+        day_of_week,
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue,
+        CAST(SUM(total_revenue) AS DOUBLE) / SUM(transaction_count) as avg_transaction_value
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
+    GROUP BY day_of_week
     ORDER BY day_of_week
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
 def query_top_revenue_days(config):
     """Query top 10 revenue days."""
-    query = """
+    query = f"""
     SELECT 
-        DATE(at) as date,
-        COUNT(*) as transaction_count,
-        SUM(total) as total_revenue
-    FROM transactions
-    GROUP BY DATE(at)
+        transaction_date as date,
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
+    GROUP BY transaction_date
     ORDER BY total_revenue DESC
     LIMIT 10
     """
-    df = wr.athena.read_sql_query(
-        query, database=config['database'], s3_output=config['s3_output'])
-    return df
+    return run_query(query, config)
 
 
-def save_query_results(outputs_dir='data/outputs'):
-    """Execute all queries and save results."""
-    Path(outputs_dir).mkdir(parents=True, exist_ok=True)
-    config = get_config()
+def query_rollup_totals(config):
+    """Query totals by date, hour, truck and payment method.
+
+    The time-based results are derived from these, and the dashboard filters
+    and re-aggregates them in memory.
+    """
+    query = f"""
+    SELECT 
+        transaction_date as date,
+        hour_of_day,
+        day_of_week,
+        truck_name,
+        fsa_rating,
+        has_card_reader,
+        payment_method,
+        SUM(transaction_count) as transaction_count,
+        SUM(total_revenue) as total_revenue
+    FROM {config['rollup_table']}
+    {get_where_clause(config)}
+    GROUP BY transaction_date, hour_of_day, day_of_week, truck_name,
+        fsa_rating, has_card_reader, payment_method
+    """
+    return run_query(query, config)
+
+
+def summarise_totals(totals, keys):
+    """Re-aggregate totals by one key or a list of keys, with the average transaction value.
 
+    Shared with the dashboard, which re-aggregates filtered rollup totals.
+    Rows are sorted by the keys. A null key is kept as its own group, and
+    unused categories are left out.
+    """
+    df = totals.groupby(keys, observed=True, dropna=False, as_index=False)[
+        ['transaction_count', 'total_revenue']].sum()
+    df['avg_transaction_value'] = df['total_revenue'] / df['transaction_count']
+    return df.sort_values(keys, ignore_index=True)
+
+
+def derive_time_results(date_hour):
+    """Derive the daily, hourly, day of week and top-day results from one scan."""
+    daily = summarise_totals(date_hour, 'date')
+    return {
+        'daily_revenue': daily,
+        'hourly_patterns': summarise_totals(date_hour, 'hour_of_day'),
+        'day_of_week_patterns': summarise_totals(date_hour, 'day_of_week'),
+        'top_revenue_days': daily.nlargest(10, 'total_revenue')[
+            ['date', 'transaction_count', 'total_revenue']].reset_index(drop=True)
+    }
+
+
+def run_queries_serially(config):
+    """Run every query one after another."""
     queries = {
         'daily_revenue': query_daily_revenue,
         'truck_performance': query_truck_performance,
         'payment_methods': query_payment_methods,
         'hourly_patterns': query_hourly_patterns,
         'day_of_week_patterns': query_day_of_week_patterns,
-        'top_revenue_days': query_top_revenue_days
+        'top_revenue_days': query_top_revenue_days,
+        'rollup_totals': query_rollup_totals
     }
 
+    results = {}
     for name, query_func in queries.items():
         print(f"Running query: {name}")
-        df = query_func(config)
-        output_path = f"{outputs_dir}/{name}.csv"
-        df.to_csv(output_path, index=False)
+        results[name] = query_func(config)
+    return results
+
+
+def run_queries_concurrently(config):
+    """Run the rollup totals scan and the truck and payment queries concurrently.
+
+    The four time-based results are derived locally from the rollup totals,
+    so a refresh costs three concurrent queries instead of seven serial ones.
+    """
+    queries = {
+        'rollup_totals': query_rollup_totals,
+        'truck_performance': query_truck_performance,
+        'payment_methods': query_payment_methods
+    }
+
+    def run(query_func):
+        if config['backend'] == 'local':
+            return query_func(config)
+        return query_func({**config, 'boto3_session': boto3.Session()})
+
+    print(f"Running queries: {', '.join(queries)}")
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        results = dict(zip(queries, executor.map(run, queries.values())))
+
+    return {**derive_time_results(results['rollup_totals']), **results}
+
+
+def save_query_results(outputs_dir='data/outputs', concurrent=True):
+    """Execute all queries and save results."""
+    Path(outputs_dir).mkdir(parents=True, exist_ok=True)
+    config = get_config()
+    config['data_version'] = get_data_version(config)
+
+    if concurrent:
+        results = run_queries_concurrently(config)
+    else:
+        results = run_queries_serially(config)
+
+    for name, df in results.items():
+        output_path = Path(outputs_dir) / f"{name}.parquet"
+        tmp_path = output_path.with_name(f"{output_path.name}.tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
         print(f"✓ Saved {name} ({len(df)} rows)")
 
+    if config['outputs_prefix']:
+        publish_query_results(outputs_dir, results, config)
+
     print(f"\n✓ All queries complete. Results saved to {outputs_dir}/")
 
 
+def publish_query_results(outputs_dir, names, config):
+    """Upload saved results to S3, where dashboards revalidate them by ETag."""
+    s3_client = boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL'))
+    for name in names:
+        s3_client.upload_file(f"{outputs_dir}/{name}.parquet", config['bucket'],
+                              f"{config['outputs_prefix']}{name}.parquet")
+    print(f"✓ Published results to s3://{config['bucket']}/{config['outputs_prefix']}")
+
+
 if __name__ == "__main__":
     save_query_results()
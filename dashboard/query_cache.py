@@ -0,0 +1,161 @@
+"""
+Versioned result cache for queries.py.
+Results are keyed by the normalized SQL and the current data version, so a
+refresh between pipeline runs is served without querying, and any newly
+landed data changes the key. Entries are Parquet files kept on local disk or
+under an S3 prefix, with least-recently-used eviction above a size bound.
+"""
+import io
+import os
+import json
+import hashlib
+import boto3
+import pandas as pd
+from pathlib import Path
+from dotenv import load_dotenv
+
+DATA_VERSION_KEY = 'inputs/_data_version.json'
+
+
+def get_cache_config():
+    """Get cache store, location and size bound from environment."""
+    load_dotenv()
+    return {
+        'store': os.getenv('QUERY_CACHE', 'local'),
+        'cache_dir': os.getenv('QUERY_CACHE_DIR', 'data/cache'),
+        'prefix': os.getenv('QUERY_CACHE_PREFIX', 'cache/queries/'),
+        'max_bytes': int(float(os.getenv('QUERY_CACHE_MAX_MB', 256)) * 1024 ** 2)
+    }
+
+
+def get_s3_client():
+    """Create an S3 client, honouring S3_ENDPOINT_URL for local stand-ins."""
+    return boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL'))
+
+
+def get_local_data_version(data_path):
+    """Hash the name, size and mtime of every Parquet file under a local path."""
+    digest = hashlib.sha256()
+    for data_file in sorted(Path(data_path).glob('year=*/month=*/day=*/*.parquet')):
+        stat = data_file.stat()
+        digest.update(f'{data_file.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def get_data_version(config):
+    """Get the version of the data the queries run against.
+
+    For local partitions this is derived from the files themselves; otherwise
+    it is the version the pipeline publishes to S3 after each upload. Returns
+    None when no version is available, which disables caching.
+    """
+    if config['backend'] == 'local' and not config['local_data_path'].startswith('s3://'):
+        return get_local_data_version(config['local_data_path'])
+    try:
+        response = get_s3_client().get_object(Bucket=config['bucket'], Key=DATA_VERSION_KEY)
+    except Exception as e:
+        print(f"Data version unavailable, caching disabled: {e}")
+        return None
+    return json.loads(response['Body'].read())['version']
+
+
+def normalize_query(query):
+    """Collapse whitespace so formatting changes do not change the cache key."""
+    return ' '.join(query.split())
+
+
+def get_cache_key(query, config):
+    """Get the cache key of a query against the current data version."""
+    key = '\n'.join([config['backend'], config['database'],
+                     config['data_version'], normalize_query(query)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def read_local_entry(key, cache_config):
+    """Read a cached result from disk, marking it as recently used."""
+    path = Path(cache_config['cache_dir']) / f'{key}.parquet'
+    if not path.exists():
+        return None
+    os.utime(path)
+    return pd.read_parquet(path)
+
+
+def write_local_entry(key, df, cache_config):
+    """Write a result to the disk cache and evict the least recently used entries."""
+    cache_dir = Path(cache_config['cache_dir'])
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_dir / f'{key}.parquet.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_dir / f'{key}.parquet')
+
+    entries = sorted(cache_dir.glob('*.parquet'), key=lambda f: f.stat().st_mtime_ns)
+    total = sum(f.stat().st_size for f in entries)
+    for entry in entries:
+        if total <= cache_config['max_bytes']:
+            break
+        total -= entry.stat().st_size
+        entry.unlink(missing_ok=True)
+
+
+def read_s3_entry(key, cache_config, config):
+    """Read a cached result from S3, refreshing its LastModified as a recency mark."""
+    s3_client = get_s3_client()
+    s3_key = f"{cache_config['prefix']}{key}.parquet"
+    try:
+        response = s3_client.get_object(Bucket=config['bucket'], Key=s3_key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    df = pd.read_parquet(io.BytesIO(response['Body'].read()))
+    s3_client.copy_object(Bucket=config['bucket'], Key=s3_key,
+                          CopySource={'Bucket': config['bucket'], 'Key': s3_key},
+                          MetadataDirective='REPLACE')
+    return df
+
+
+def write_s3_entry(key, df, cache_config, config):
+    """Write a result to the S3 cache and evict the least recently used entries."""
+    s3_client = get_s3_client()
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    s3_client.put_object(Bucket=config['bucket'],
+                         Key=f"{cache_config['prefix']}{key}.parquet",
+                         Body=buffer.getvalue())
+
+    entries = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=config['bucket'], Prefix=cache_config['prefix']):
+        entries.extend(page.get('Contents', []))
+    entries.sort(key=lambda obj: obj['LastModified'])
+
+    total = sum(obj['Size'] for obj in entries)
+    stale_keys = []
+    for obj in entries:
+        if total <= cache_config['max_bytes']:
+            break
+        total -= obj['Size']
+        stale_keys.append({'Key': obj['Key']})
+    for i in range(0, len(stale_keys), 1000):
+        s3_client.delete_objects(Bucket=config['bucket'],
+                                 Delete={'Objects': stale_keys[i:i + 1000]})
+
+
+def cached_query(query, config, execute):
+    """Return a query's cached result, or run it with execute and cache the result."""
+    cache_config = get_cache_config()
+    if cache_config['store'] == 'off' or not config.get('data_version'):
+        return execute(query, config)
+
+    key = get_cache_key(query, config)
+    if cache_config['store'] == 's3':
+        df = read_s3_entry(key, cache_config, config)
+    else:
+        df = read_local_entry(key, cache_config)
+    if df is not None:
+        return df
+
+    df = execute(query, config)
+    if cache_config['store'] == 's3':
+        write_s3_entry(key, df, cache_config, config)
+    else:
+        write_local_entry(key, df, cache_config)
+    return df
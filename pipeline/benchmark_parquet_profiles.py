@@ -0,0 +1,140 @@
+"""
+Benchmark of the Parquet encoding profiles in create_parquet.
+Writes the combined data under each profile and reports file size, write
+time and scan time for the aggregations in dashboard/queries.py, plus a
+selective single-truck query that exercises row-group pruning.
+"""
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pathlib import Path
+from benchmark_transform import load_scaled_data, transform_after
+from create_parquet import (PARQUET_PROFILES, PARTITIONING,
+                            create_time_partitioned_parquet, get_writer_config)
+
+
+def load_benchmark_data(scale):
+    """Build a combined dataset with each repetition shifted onto new days."""
+    trucks, payment, transactions = load_scaled_data(scale)
+    repetition = np.arange(len(transactions)) // (len(transactions) // scale)
+    transactions['at'] = pd.to_datetime(
+        transactions['at']) + pd.to_timedelta(repetition * 17, unit='D')
+    return transform_after(trucks, payment, transactions)
+
+
+def aggregate_totals(table, keys):
+    """Count, sum and average total grouped by keys."""
+    return table.group_by(keys).aggregate(
+        [('total', 'count'), ('total', 'sum'), ('total', 'mean')])
+
+
+def scan_daily_revenue(dataset):
+    """Daily revenue, as in query_daily_revenue."""
+    table = dataset.to_table(columns=['at', 'total'])
+    table = table.append_column('date', pc.cast(table['at'], pa.date32()))
+    return aggregate_totals(table, ['date'])
+
+
+def scan_truck_performance(dataset):
+    """Truck performance, as in query_truck_performance."""
+    table = dataset.to_table(
+        columns=['truck_name', 'fsa_rating', 'has_card_reader', 'total'])
+    return aggregate_totals(table, ['truck_name', 'fsa_rating', 'has_card_reader'])
+
+
+def scan_payment_methods(dataset):
+    """Payment method totals, as in query_payment_methods."""
+    return aggregate_totals(dataset.to_table(columns=['payment_method', 'total']),
+                            ['payment_method'])
+
+
+def scan_hourly_patterns(dataset):
+    """Hourly totals, as in query_hourly_patterns."""
+    table = dataset.to_table(columns=['at', 'total'])
+    table = table.append_column('hour_of_day', pc.hour(table['at']))
+    return aggregate_totals(table, ['hour_of_day'])
+
+
+def scan_day_of_week_patterns(dataset):
+    """Day of week totals, as in query_day_of_week_patterns."""
+    table = dataset.to_table(columns=['at', 'total'])
+    table = table.append_column(
+        'day_of_week', pc.day_of_week(table['at'], count_from_zero=False))
+    return aggregate_totals(table, ['day_of_week'])
+
+
+def scan_top_revenue_days(dataset):
+    """Top 10 revenue days, as in query_top_revenue_days."""
+    daily = scan_daily_revenue(dataset)
+    return daily.sort_by([('total_sum', 'descending')]).slice(0, 10)
+
+
+def scan_single_truck(dataset):
+    """Selective scan of one truck, which benefits from sorting and statistics."""
+    return dataset.to_table(columns=['at', 'total'],
+                            filter=pc.field('truck_id') == 3).num_rows
+
+
+SCAN_QUERIES = {
+    'daily_revenue': scan_daily_revenue,
+    'truck_performance': scan_truck_performance,
+    'payment_methods': scan_payment_methods,
+    'hourly_patterns': scan_hourly_patterns,
+    'day_of_week_patterns': scan_day_of_week_patterns,
+    'top_revenue_days': scan_top_revenue_days,
+    'single_truck': scan_single_truck
+}
+
+
+def time_call(func, *args, repeat=3):
+    """Best wall time of func over several runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_profile(name, combined, output_dir):
+    """Write combined data with one profile and time scans over it."""
+    profile = PARQUET_PROFILES[name]
+    config = {**get_writer_config(), 'profile': profile,
+              'max_rows_per_group': profile['max_rows_per_group']}
+
+    start = time.perf_counter()
+    written_files = create_time_partitioned_parquet(combined, config, output_dir)
+    write_time = time.perf_counter() - start
+
+    dataset = ds.dataset(output_dir, format='parquet', partitioning=PARTITIONING)
+    return {
+        'size_mb': sum(Path(f).stat().st_size for f in written_files) / 1024 ** 2,
+        'write_s': write_time,
+        'scans': {query: time_call(func, dataset) for query, func in SCAN_QUERIES.items()}
+    }
+
+
+def run_benchmark(scale=20):
+    """Benchmark every profile and print a comparison."""
+    combined = load_benchmark_data(scale)
+    print(f"Benchmarking Parquet profiles on {len(combined):,} transactions\n")
+
+    results = {}
+    for name in PARQUET_PROFILES:
+        with tempfile.TemporaryDirectory() as output_dir:
+            results[name] = benchmark_profile(name, combined, output_dir)
+
+    print(f"\n{'profile':<12}{'size (MB)':>11}{'write (s)':>11}"
+          + ''.join(f'{query[:14]:>16}' for query in SCAN_QUERIES))
+    for name, result in results.items():
+        print(f"{name:<12}{result['size_mb']:>11.2f}{result['write_s']:>11.3f}"
+              + ''.join(f"{result['scans'][query]:>16.4f}" for query in SCAN_QUERIES))
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,252 @@
+"""
+End-to-end benchmark of the pipeline and the dashboard queries at scale.
+Generates synthetic data into a SQLite stand-in for RDS (or the DB_* MySQL
+database with BENCHMARK_DATABASE=mysql), runs the sequential and pipelined
+pipelines against moto S3 with per-stage telemetry, and times the
+dashboard/queries.py aggregations with DuckDB over the resulting rollup.
+Results are written as JSON and compared with the previous run.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import platform
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from unittest import mock
+from datetime import datetime, timezone
+import boto3
+from moto import mock_aws
+from dotenv import load_dotenv
+import extract
+import pipeline
+from generate_data import get_generator_config, write_synthetic_data
+
+PIPELINE_DIR = Path(__file__).resolve().parent
+DASHBOARD_DIR = PIPELINE_DIR.parent / 'dashboard'
+BENCHMARK_BUCKET = 'benchmark-bucket'
+
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """A SQLite cursor that accepts the MySQL-flavoured SQL extract.py issues."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, query, params=None):
+        if query.startswith('CHECKSUM TABLE'):
+            table = query.split()[-1]
+            query = f"SELECT '{table}', COUNT(*) || ':' || MAX(rowid) FROM {table}"
+        return self.cursor.execute(query.replace('%s', '?'), params or ())
+
+
+class SQLiteConnection:
+    """A SQLite connection standing in for the pymysql connection extract.py expects.
+
+    Server-side cursors are not needed: SQLite cursors already fetch lazily.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                          check_same_thread=False)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self.connection.cursor())
+
+
+def get_benchmark_config():
+    """Get the source database, pipeline modes, query repeats and results directory."""
+    load_dotenv()
+    return {
+        'database': os.getenv('BENCHMARK_DATABASE', 'sqlite'),
+        'modes': os.getenv('BENCHMARK_MODES', 'sequential,pipelined').split(','),
+        'repeats': int(os.getenv('BENCHMARK_REPEATS', 3)),
+        'results_dir': Path(os.getenv('BENCHMARK_RESULTS_DIR', 'data/benchmarks')).resolve()
+    }
+
+
+def get_commit():
+    """Get the current commit, marked dirty if the working tree has changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PIPELINE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain'], cwd=PIPELINE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-dirty' if status.strip() else commit
+
+
+def read_metrics(path):
+    """Read the stage metrics appended to a JSON-lines file."""
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def run_pipeline_mode(mode, work_dir, connect):
+    """Run the full pipeline in one mode against moto S3 and return its metrics."""
+    os.makedirs(work_dir / 'data/raw')
+    os.chdir(work_dir)
+    metrics_path = work_dir / 'metrics.jsonl'
+    environment = {
+        'EXTRACT_MODE': 'full',
+        'EXTRACT_STREAMING': 'false',
+        'EXTRACT_WORKERS': '1',
+        'PIPELINE_PERSIST_CSV': 'false',
+        'PIPELINE_PIPELINED': str(mode == 'pipelined').lower(),
+        'PIPELINE_METRICS_FORMAT': 'json',
+        'PIPELINE_METRICS_PATH': str(metrics_path),
+        'S3_BUCKET_NAME': BENCHMARK_BUCKET,
+        'AWS_DEFAULT_REGION': 'us-east-1'
+    }
+
+    with mock.patch.dict(os.environ, environment), mock_aws(), \
+            mock.patch.object(extract, 'get_db_connection', connect):
+        boto3.client('s3').create_bucket(Bucket=BENCHMARK_BUCKET)
+        start = time.perf_counter()
+        pipeline.run_pipeline()
+        wall_s = time.perf_counter() - start
+
+    return {'wall_s': round(wall_s, 3), 'stages': read_metrics(metrics_path)}
+
+
+def time_query(query_func, config, repeats):
+    """Run a query repeatedly and return its median wall time and row count."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = query_func(config)
+        timings.append(time.perf_counter() - start)
+    rows = sum(len(df) for df in result.values()) if isinstance(result, dict) else len(result)
+    return {'wall_s': round(statistics.median(timings), 4), 'rows': rows}
+
+
+def run_query_benchmark(rollup_path, repeats):
+    """Time each dashboard query and a full concurrent refresh with DuckDB over the rollup."""
+    sys.path.insert(0, str(DASHBOARD_DIR))
+    import queries
+
+    environment = {'QUERY_BACKEND': 'local', 'LOCAL_DATA_PATH': str(rollup_path),
+                   'QUERY_CACHE': 'off', 'QUERY_START_DATE': '', 'QUERY_END_DATE': ''}
+    with mock.patch.dict(os.environ, environment):
+        config = queries.get_config()
+        query_funcs = {
+            'daily_revenue': queries.query_daily_revenue,
+            'truck_performance': queries.query_truck_performance,
+            'payment_methods': queries.query_payment_methods,
+            'hourly_patterns': queries.query_hourly_patterns,
+            'day_of_week_patterns': queries.query_day_of_week_patterns,
+            'top_revenue_days': queries.query_top_revenue_days,
+            'rollup_totals': queries.query_rollup_totals,
+            'concurrent_refresh': queries.run_queries_concurrently
+        }
+        return {name: time_query(query_func, config, repeats)
+                for name, query_func in query_funcs.items()}
+
+
+def flatten_timings(results):
+    """Map each stage and query in a results document to its wall time."""
+    timings = {}
+    for mode, run in results['pipeline'].items():
+        timings[f'{mode} total'] = run['wall_s']
+        for stage in run['stages']:
+            timings[f"{mode} {stage['stage']}"] = stage['wall_s']
+    for name, query in results['queries'].items():
+        timings[f'query {name}'] = query['wall_s']
+    return timings
+
+
+def print_comparison(previous, current):
+    """Print wall times against the previous results."""
+    before, after = flatten_timings(previous), flatten_timings(current)
+    print(f"\nCompared with {previous['commit']} ({previous['timestamp']}, "
+          f"{previous['data']['rows']:,} rows):")
+    print(f"{'':<36}{'before (s)':>12}{'after (s)':>12}{'change':>10}")
+    for name, seconds in after.items():
+        if before.get(name):
+            change = (seconds - before[name]) / before[name] * 100
+            print(f"{name:<36}{before[name]:>12.3f}{seconds:>12.3f}{change:>+9.0f}%")
+
+
+def save_results(results, results_dir):
+    """Write results to a timestamped JSON file and compare them with the latest previous file."""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    previous_files = sorted(results_dir.glob('*.json'))
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    path = results_dir / f"{timestamp}-{results['commit'] or 'unknown'}.json"
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Saved benchmark results to {path}")
+
+    if previous_files:
+        with open(previous_files[-1]) as f:
+            print_comparison(json.load(f), results)
+
+
+def run_benchmark(rows=None):
+    """Generate synthetic data, benchmark every pipeline mode and the queries, and save results."""
+    config = get_benchmark_config()
+    generator_config = get_generator_config()
+    if rows:
+        generator_config['rows'] = rows
+    sample_dir = Path('data/raw').resolve()
+    original_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_path = Path(tmp_dir) / 'source.db'
+        generator_config['target'] = config['database']
+        generator_config['output'] = str(source_path)
+        start = time.perf_counter()
+        write_synthetic_data(generator_config, sample_dir)
+        generate_s = time.perf_counter() - start
+
+        if config['database'] == 'sqlite':
+            def connect():
+                return SQLiteConnection(source_path)
+        else:
+            connect = extract.get_db_connection
+
+        try:
+            runs = {mode: run_pipeline_mode(mode, Path(tmp_dir) / mode, connect)
+                    for mode in config['modes']}
+            rollup_path = Path(tmp_dir) / config['modes'][-1] / 'data/rollup'
+            query_results = run_query_benchmark(rollup_path, config['repeats'])
+        finally:
+            os.chdir(original_dir)
+
+    results = {
+        'commit': get_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'cpu_count': os.cpu_count()},
+        'data': {'rows': generator_config['rows'], 'trucks': generator_config['trucks'],
+                 'days': generator_config['days'], 'database': config['database'],
+                 'generate_s': round(generate_s, 3)},
+        'pipeline': runs,
+        'queries': query_results
+    }
+    save_results(results, config['results_dir'])
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(float(sys.argv[1])) if len(sys.argv) > 1 else None)
@@ -0,0 +1,68 @@
+"""
+Benchmark of the transform stage on a scaled-up FACT_Transaction table.
+Compares the original inferred-dtype merge against the compact schema with
+array-based dimension lookup, reporting wall time and combined memory.
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from transform import (PAYMENT_SCHEMA, TRUCK_SCHEMA, clean_dimension,
+                       clean_transactions, create_combined_dataset)
+
+
+def load_scaled_data(scale):
+    """Load the raw tables, repeating transactions scale times with fresh ids."""
+    trucks = pd.read_csv('data/raw/DIM_Truck.csv')
+    payment = pd.read_csv('data/raw/DIM_Payment_Method.csv')
+    transactions = pd.read_csv('data/raw/FACT_Transaction.csv')
+
+    scaled = pd.concat([transactions] * scale, ignore_index=True)
+    scaled['transaction_id'] = np.arange(1, len(scaled) + 1)
+    return trucks, payment, scaled
+
+
+def transform_before(trucks, payment, transactions):
+    """Original transform: inferred dtypes and two hash merges."""
+    transactions = transactions.copy()
+    transactions['at'] = pd.to_datetime(transactions['at'])
+    transactions['total'] = pd.to_numeric(
+        transactions['total'], errors='coerce')
+    transactions = transactions[transactions['total'] > 0].dropna(
+        subset=['transaction_id', 'truck_id', 'total', 'at'])
+    return transactions.merge(trucks, on='truck_id', how='left').merge(payment, on='payment_method_id', how='left')
+
+
+def transform_after(trucks, payment, transactions):
+    """Current transform: compact schema and id-indexed lookup."""
+    trucks = clean_dimension(trucks, TRUCK_SCHEMA)
+    payment = clean_dimension(payment, PAYMENT_SCHEMA)
+    transactions = clean_transactions(transactions.copy())
+    return create_combined_dataset(transactions, trucks, payment)
+
+
+def measure(transform_func, trucks, payment, transactions):
+    """Run a transform and return its wall time and result memory in MB."""
+    start = time.perf_counter()
+    combined = transform_func(trucks, payment, transactions)
+    elapsed = time.perf_counter() - start
+    return elapsed, combined.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def run_benchmark(scale=200):
+    """Benchmark both transforms and print a comparison."""
+    trucks, payment, transactions = load_scaled_data(scale)
+    print(f"Benchmarking transform on {len(transactions):,} transactions")
+
+    before = measure(transform_before, trucks, payment, transactions)
+    after = measure(transform_after, trucks, payment, transactions)
+
+    print(f"{'':<8}{'time (s)':>12}{'memory (MB)':>14}")
+    print(f"{'before':<8}{before[0]:>12.3f}{before[1]:>14.1f}")
+    print(f"{'after':<8}{after[0]:>12.3f}{after[1]:>14.1f}")
+    print(f"\n✓ {before[0] / after[0]:.1f}x faster, "
+          f"{before[1] / after[1]:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
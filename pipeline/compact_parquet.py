@@ -0,0 +1,136 @@
+"""
+Compaction job for the time-partitioned transactions data.
+Merges the small files in each closed day partition into target-sized files
+sorted by truck_id and at, so that row-group statistics prune well. The
+merged files are published as a new generation of the partition.
+"""
+import os
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+from dotenv import load_dotenv
+from create_parquet import (get_file_write_options, get_generation_dir, get_writer_config,
+                            new_generation, publish_partition)
+
+PARQUET_DIR = Path('data/parquet')
+MANIFEST_PATH = PARQUET_DIR / '_compaction_manifest.json'
+SORT_KEYS = [('truck_id', 'ascending'), ('at', 'ascending')]
+
+
+def get_compaction_config():
+    """Get compaction target file size and closed-partition age from environment."""
+    load_dotenv()
+    return {
+        'target_bytes': int(float(os.getenv('COMPACT_TARGET_MB', 128)) * 1024 ** 2),
+        'min_age_days': int(os.getenv('COMPACT_MIN_AGE_DAYS', 1))
+    }
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest of compacted partitions."""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Persist the compaction manifest atomically."""
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def get_partition_date(partition_dir):
+    """Get the date of a year=/month=/day= partition directory."""
+    day, month, year = (part.split('=')[1] for part in partition_dir.parts[-1:-4:-1])
+    return date(int(year), int(month), int(day))
+
+
+def find_closed_partitions(min_age_days):
+    """Find day partitions old enough that no more data is expected for them."""
+    cutoff = date.today() - timedelta(days=min_age_days)
+    return sorted(partition_dir for partition_dir in PARQUET_DIR.glob('year=*/month=*/day=*')
+                  if get_partition_date(partition_dir) < cutoff)
+
+
+def get_partition_fingerprint(partition_dir):
+    """Get the path, size and mtime of each file a partition currently points at."""
+    fingerprint = []
+    for f in sorted(partition_dir.glob('*.parquet')):
+        stat = f.stat()
+        fingerprint.append([f.resolve().relative_to(PARQUET_DIR.resolve()).as_posix(),
+                            stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def write_compacted_files(table, generation_dir, target_bytes, source_bytes):
+    """Write a sorted table as files of roughly target_bytes each."""
+    bytes_per_row = source_bytes / max(table.num_rows, 1)
+    rows_per_file = max(1, int(target_bytes / bytes_per_row))
+    config = get_writer_config()
+    row_group_size = min(config['max_rows_per_group'], rows_per_file)
+
+    generation_dir.mkdir(parents=True)
+    file_names = []
+    for i, offset in enumerate(range(0, table.num_rows, rows_per_file)):
+        file_name = f'transactions-{i}.parquet'
+        chunk = table.slice(offset, rows_per_file)
+        pq.write_table(chunk, generation_dir / file_name, row_group_size=row_group_size,
+                       **get_file_write_options(config['profile'], chunk.num_rows))
+        file_names.append(file_name)
+    return file_names
+
+
+def compact_partition(partition_dir, target_bytes):
+    """Merge a partition's files into sorted, target-sized files and publish them."""
+    source_files = sorted(partition_dir.glob('*.parquet'))
+    source_bytes = sum(f.stat().st_size for f in source_files)
+    table = pa.concat_tables(
+        [pq.read_table(f) for f in source_files], promote_options='permissive')
+    table = table.sort_by(SORT_KEYS)
+
+    partition_key = partition_dir.relative_to(PARQUET_DIR).as_posix()
+    generation = new_generation()
+    write_compacted_files(table, get_generation_dir(PARQUET_DIR, partition_key, generation),
+                          target_bytes, source_bytes)
+    publish_partition(PARQUET_DIR, partition_key, generation)
+
+    return {
+        'files': get_partition_fingerprint(partition_dir),
+        'rows': table.num_rows,
+        'source_files': len(source_files),
+        'compacted_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+    }
+
+
+def compact_parquet_files(config=None):
+    """Compact every closed day partition that changed since it was last compacted.
+
+    A partition has changed when any of its files differs in path, size or
+    mtime from those the manifest recorded, so a rewrite that reuses the
+    same file names is still picked up.
+    """
+    config = config or get_compaction_config()
+    manifest = load_manifest()
+    compacted = 0
+
+    for partition_dir in find_closed_partitions(config['min_age_days']):
+        key = partition_dir.relative_to(PARQUET_DIR).as_posix()
+        if key in manifest and manifest[key]['files'] == get_partition_fingerprint(partition_dir):
+            continue
+
+        manifest[key] = compact_partition(partition_dir, config['target_bytes'])
+        save_manifest(manifest)
+        compacted += 1
+        print(f"✓ Compacted {key} "
+              f"({manifest[key]['source_files']} → {len(manifest[key]['files'])} files)")
+
+    print(f"✓ Compaction complete ({compacted} partitions compacted)")
+
+
+if __name__ == "__main__":
+    compact_parquet_files()
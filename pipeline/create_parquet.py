@@ -1,38 +1,381 @@
+import os
+import uuid
+import shutil
+import hashlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from telemetry import record_metrics
 
+PARTITION_COLUMNS = ['year', 'month', 'day']
+PARTITIONING = ds.partitioning(pa.schema([
+    (column, pa.string()) for column in PARTITION_COLUMNS
+]), flavor='hive')
+GENERATIONS_DIR = '_generations'
+DICTIONARY_COLUMNS = ['truck_id', 'payment_method_id', 'truck_name', 'truck_description',
+                      'has_card_reader', 'fsa_rating', 'payment_method']
 
-def create_time_partitioned_parquet():
-    """Create time-partitioned parquet files from combined data."""
-    df = pd.read_csv('data/clean/combined_data.csv')
-    df['at'] = pd.to_datetime(df['at'])
-    df['year'] = df['at'].dt.year
-    df['month'] = df['at'].dt.month
-    df['day'] = df['at'].dt.day
+# Encoding profiles, selected with PARQUET_PROFILE. write_options are passed
+# to the Parquet writer; bloom filters need the per-file writer, so profiles
+# that use them write partitions one at a time.
+PARQUET_PROFILES = {
+    'default': {
+        'write_options': {},
+        'sort_by': ['at'],
+        'max_rows_per_group': 128 * 1024
+    },
+    'balanced': {
+        'write_options': {'compression': 'zstd', 'compression_level': 3,
+                          'use_dictionary': DICTIONARY_COLUMNS,
+                          'write_statistics': True, 'write_page_index': True},
+        'sort_by': ['truck_id', 'at'],
+        'max_rows_per_group': 128 * 1024
+    },
+    'compact': {
+        'write_options': {'compression': 'zstd', 'compression_level': 9,
+                          'use_dictionary': DICTIONARY_COLUMNS,
+                          'write_statistics': True},
+        'sort_by': ['truck_id', 'at'],
+        'max_rows_per_group': 1024 * 1024
+    },
+    'selective': {
+        'write_options': {'compression': 'snappy',
+                          'use_dictionary': DICTIONARY_COLUMNS,
+                          'write_statistics': True, 'write_page_index': True},
+        'sort_by': ['truck_id', 'at'],
+        'max_rows_per_group': 32 * 1024,
+        'bloom_filter_columns': ['truck_id']
+    }
+}
 
-    for (year, month, day), group in df.groupby(['year', 'month', 'day']):
-        partition_dir = Path(
-            f'data/parquet/year={year}/month={month:02d}/day={day:02d}')
-        partition_dir.mkdir(parents=True, exist_ok=True)
-        group.drop(['year', 'month', 'day'], axis=1).to_parquet(
-            partition_dir / 'transactions.parquet', index=False)
-        print(f"✓ Created year={year}/month={month:02d}/day={day:02d}")
 
+def get_writer_config():
+    """Get partitioned writer limits and encoding profile from environment."""
+    load_dotenv()
+    profile = PARQUET_PROFILES[os.getenv('PARQUET_PROFILE', 'default')]
+    return {
+        'profile': profile,
+        'max_rows_per_file': int(os.getenv('PARQUET_MAX_ROWS_PER_FILE', 1_000_000)),
+        'max_rows_per_group': int(os.getenv('PARQUET_MAX_ROWS_PER_GROUP',
+                                            profile['max_rows_per_group']))
+    }
 
-def create_dimension_parquet():
+
+def get_file_write_options(profile, num_rows):
+    """Get pq.write_table options for a profile, including any bloom filters."""
+    options = dict(profile['write_options'])
+    if profile.get('bloom_filter_columns'):
+        options['bloom_filter_options'] = {
+            column: {'ndv': max(num_rows, 1), 'fpp': 0.01}
+            for column in profile['bloom_filter_columns']}
+    return options
+
+
+def add_partition_columns(table, column='at'):
+    """Add zero-padded year/month/day partition columns derived from a date column."""
+    for name, fmt in [('year', '%Y'), ('month', '%m'), ('day', '%d')]:
+        table = table.append_column(name, pc.strftime(table[column], format=fmt))
+    return table
+
+
+def iter_partition_slices(table):
+    """Yield the year=/month=/day= key and rows of each partition of a partition-sorted table."""
+    keys = pc.binary_join_element_wise(
+        *[table[column] for column in PARTITION_COLUMNS], '/').combine_chunks()
+    runs = pc.run_end_encode(keys)
+    data = table.drop_columns(PARTITION_COLUMNS)
+
+    start = 0
+    for key, end in zip(runs.values.to_pylist(), runs.run_ends.to_pylist()):
+        year, month, day = key.split('/')
+        yield f'year={year}/month={month}/day={day}', data.slice(start, end - start)
+        start = end
+
+
+def new_generation():
+    """Get a unique, time-ordered name for a new set of partition files."""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+
+
+def get_generation_dir(output_dir, partition_key, generation):
+    """Get the directory holding one generation of a partition's files."""
+    return Path(output_dir) / GENERATIONS_DIR / partition_key / generation
+
+
+def get_file_digest(path):
+    """Get the MD5 of a file's contents."""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def is_same_file(path, other_path):
+    """Check whether two files have the same contents, comparing sizes before hashing."""
+    return (path.stat().st_size == other_path.stat().st_size
+            and get_file_digest(path) == get_file_digest(other_path))
+
+
+def matches_published_file(path, output_dir='data/parquet'):
+    """Check whether a file written to a new generation matches its partition's published file of the same name."""
+    path = Path(path)
+    partition_key = path.parent.relative_to(Path(output_dir) / GENERATIONS_DIR).parent.as_posix()
+    published_file = Path(output_dir) / partition_key / path.name
+    return published_file.is_file() and is_same_file(path, published_file)
+
+
+def is_same_generation(generation_dir, other_dir):
+    """Check whether two generations hold the same file names with the same contents."""
+    files = sorted(generation_dir.iterdir())
+    other_files = sorted(other_dir.iterdir())
+    return ([f.name for f in files] == [f.name for f in other_files]
+            and all(is_same_file(f, other) for f, other in zip(files, other_files)))
+
+
+def write_partition_files(data, partition_dir, config, row_group_size,
+                          file_prefix='transactions'):
+    """Write one partition's rows as files of at most max_rows_per_file rows."""
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    written_files = []
+    for i, offset in enumerate(range(0, data.num_rows, config['max_rows_per_file'])):
+        chunk = data.slice(offset, config['max_rows_per_file'])
+        path = str(partition_dir / f'{file_prefix}-{i}.parquet')
+        pq.write_table(chunk, path, row_group_size=row_group_size,
+                       **get_file_write_options(config['profile'], chunk.num_rows))
+        written_files.append(path)
+    return written_files
+
+
+def write_partitions_with_writer(table, output_dir, config, row_group_size,
+                                 file_prefix, generation):
+    """Write each partition of a partition-sorted table to a generation with pq.write_table."""
+    written_files = []
+    for partition_key, data in iter_partition_slices(table):
+        written_files += write_partition_files(
+            data, get_generation_dir(output_dir, partition_key, generation),
+            config, row_group_size, file_prefix)
+    return written_files
+
+
+def move_to_generation(written_files, staging_dir, output_dir, generation):
+    """Move files written under a staging year=/month=/day= tree into a generation."""
+    moved_files = []
+    for path in map(Path, written_files):
+        partition_key = path.parent.relative_to(staging_dir).as_posix()
+        generation_dir = get_generation_dir(output_dir, partition_key, generation)
+        generation_dir.mkdir(parents=True, exist_ok=True)
+        os.rename(path, generation_dir / path.name)
+        moved_files.append(str(generation_dir / path.name))
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return moved_files
+
+
+def publish_partition(output_dir, partition_key, generation):
+    """Point a partition at a generation of its files and remove its other generations.
+
+    Each year=/month=/day= partition is a symlink into _generations/, which
+    Parquet dataset readers and the uploader's globs skip. The link is
+    replaced with a single rename, so a reader sees either the old file set
+    or the new one and never a missing day. A partition written in place
+    by an earlier version is moved aside first, a one-off gap.
+
+    A new generation whose files are byte-identical to the published ones
+    is discarded instead, so rewriting unchanged data keeps the published
+    paths, and with them the uploaded objects and compaction manifest
+    entries. Returns the generation the partition points at.
+    """
+    partition_dir = Path(output_dir) / partition_key
+    generation_dir = get_generation_dir(output_dir, partition_key, generation)
+    if not generation_dir.is_dir():
+        raise FileNotFoundError(f"No generation {generation} of {partition_key}")
+
+    if partition_dir.is_symlink():
+        published_dir = partition_dir.resolve()
+        if (published_dir != generation_dir.resolve() and published_dir.is_dir()
+                and is_same_generation(generation_dir, published_dir)):
+            shutil.rmtree(generation_dir)
+            return published_dir.name
+
+    partition_dir.parent.mkdir(parents=True, exist_ok=True)
+    link = partition_dir.with_name(f'_publishing-{partition_dir.name}')
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(os.path.relpath(generation_dir, partition_dir.parent), link)
+    if partition_dir.is_dir() and not partition_dir.is_symlink():
+        retired_dir = partition_dir.with_name(f'_retired-{partition_dir.name}')
+        os.rename(partition_dir, retired_dir)
+        os.replace(link, partition_dir)
+        shutil.rmtree(retired_dir)
+    else:
+        os.replace(link, partition_dir)
+
+    for other_dir in generation_dir.parent.iterdir():
+        if other_dir != generation_dir:
+            shutil.rmtree(other_dir)
+    return generation
+
+
+def get_published_files(output_dir, partition_keys):
+    """Get the paths of the files the given partitions point at."""
+    return [str(path) for partition_key in partition_keys
+            for path in sorted((Path(output_dir) / partition_key).glob('*.parquet'))]
+
+
+def merge_partition(existing_files, data, sort_by):
+    """Union a partition's existing rows with new ones, keeping the new row for each transaction_id.
+
+    Landed ids are dropped before the upsert, so an id is only seen twice
+    when a failed run merged the batch locally before its landed id index
+    was saved; keeping one row makes the retry idempotent.
+    """
+    tables = [data] + [pq.read_table(f) for f in existing_files]
+    merged = pa.concat_tables(tables, promote_options='permissive')
+    _, first_rows = np.unique(merged['transaction_id'].to_numpy(), return_index=True)
+    merged = merged.take(np.sort(first_rows))
+    return merged.sort_by([(column, 'ascending') for column in sort_by])
+
+
+def create_time_partitioned_parquet(combined=None, config=None, output_dir='data/parquet',
+                                    file_prefix='transactions', generation=None):
+    """Create time-partitioned parquet files from combined data.
+
+    Writes every year=/month=/day= partition in a single pass with
+    pyarrow.dataset, using the encoding profile in config. Partitions present
+    in the data are replaced by publishing a new generation of their files;
+    others are left untouched. Given a generation, files are added to that
+    generation of each partition without publishing it, so a run can write
+    a partition over several calls (file_prefix must then be unique per
+    call) and publish it once with publish_partition. Returns the paths of
+    the files written, or, once published, of the files the partitions
+    point at.
+    """
+    df = pd.read_csv('data/clean/combined_data.csv') if combined is None else combined
+    if not pd.api.types.is_datetime64_any_dtype(df['at']):
+        df = df.assign(at=pd.to_datetime(df['at']))
+    config = config or get_writer_config()
+    profile = config['profile']
+    row_group_size = min(config['max_rows_per_group'], config['max_rows_per_file'])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = add_partition_columns(table).sort_by(
+        [(column, 'ascending') for column in PARTITION_COLUMNS + profile['sort_by']])
+
+    publish = generation is None
+    generation = generation or new_generation()
+    if profile.get('bloom_filter_columns'):
+        written_files = write_partitions_with_writer(
+            table, output_dir, config, row_group_size, file_prefix, generation)
+    else:
+        staging_dir = Path(output_dir) / f'_staging-{generation}-{file_prefix}'
+        written_files = []
+        ds.write_dataset(
+            table, staging_dir, format='parquet',
+            partitioning=PARTITIONING,
+            basename_template=f'{file_prefix}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(
+                **profile['write_options']),
+            max_partitions=100_000,
+            max_rows_per_file=config['max_rows_per_file'],
+            max_rows_per_group=row_group_size,
+            use_threads=True,
+            file_visitor=lambda written: written_files.append(written.path))
+        written_files = move_to_generation(written_files, staging_dir, output_dir, generation)
+
+    unchanged = 0
+    if publish:
+        partition_keys = [partition_key for partition_key, _ in iter_partition_slices(table)]
+        for partition_key in partition_keys:
+            unchanged += publish_partition(output_dir, partition_key, generation) != generation
+        written_files = get_published_files(output_dir, partition_keys)
+    record_metrics(rows_in=len(df), rows_out=table.num_rows)
+    partitions = {os.path.dirname(path) for path in written_files}
+    unchanged_note = f", {unchanged} unchanged" if publish else ''
+    print(f"✓ Created {len(partitions)} partitions ({len(written_files)} files{unchanged_note})")
+    return written_files
+
+
+def upsert_time_partitioned_parquet(combined, config=None, output_dir='data/parquet'):
+    """Merge a batch into the day partitions it touches, leaving all others untouched.
+
+    Each touched partition is read, unioned with the batch's rows for that
+    day, deduplicated on transaction_id, written as a new generation and
+    published, so earlier rows for the day survive and readers never see a
+    half-written partition. Returns the paths of the files in the
+    rewritten partitions.
+    """
+    df = combined
+    if not pd.api.types.is_datetime64_any_dtype(df['at']):
+        df = df.assign(at=pd.to_datetime(df['at']))
+    config = config or get_writer_config()
+    profile = config['profile']
+    row_group_size = min(config['max_rows_per_group'], config['max_rows_per_file'])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = add_partition_columns(table).sort_by(
+        [(column, 'ascending') for column in PARTITION_COLUMNS + profile['sort_by']])
+
+    generation = new_generation()
+    written_files = []
+    merged_partitions = replaced_rows = 0
+    for partition_key, data in iter_partition_slices(table):
+        existing_files = sorted((Path(output_dir) / partition_key).glob('*.parquet'))
+        merged = merge_partition(existing_files, data, profile['sort_by'])
+        if existing_files:
+            merged_partitions += 1
+            replaced_rows += data.num_rows + sum(
+                pq.read_metadata(f).num_rows for f in existing_files) - merged.num_rows
+
+        write_partition_files(merged, get_generation_dir(output_dir, partition_key, generation),
+                              config, row_group_size)
+        publish_partition(output_dir, partition_key, generation)
+        written_files += get_published_files(output_dir, [partition_key])
+
+    record_metrics(rows_in=len(df), rows_out=table.num_rows - replaced_rows)
+    partitions = {os.path.dirname(path) for path in written_files}
+    print(f"✓ Upserted {len(partitions)} partitions ({merged_partitions} merged with "
+          f"existing rows, {replaced_rows} rows replaced, {len(written_files)} files)")
+    return written_files
+
+
+def create_dimension_parquet(trucks=None, payment=None):
     """Create dimension table parquet files."""
     Path('data/parquet/dimensions').mkdir(parents=True, exist_ok=True)
-    pd.read_csv('data/clean/trucks_clean.csv').to_parquet(
-        'data/parquet/dimensions/trucks.parquet', index=False)
-    pd.read_csv('data/clean/payment_methods_clean.csv').to_parquet(
+    if trucks is None:
+        trucks = pd.read_csv('data/clean/trucks_clean.csv')
+    if payment is None:
+        payment = pd.read_csv('data/clean/payment_methods_clean.csv')
+    trucks.to_parquet('data/parquet/dimensions/trucks.parquet', index=False)
+    payment.to_parquet(
         'data/parquet/dimensions/payment_methods.parquet', index=False)
     print("✓ Created dimension tables")
 
 
-def create_parquet_files():
-    """Main parquet creation pipeline."""
-    create_time_partitioned_parquet()
-    create_dimension_parquet()
+def create_parquet_files(clean=None, upsert=False):
+    """Main parquet creation pipeline.
+
+    Uses the cleaned tables returned by transform_data when given,
+    otherwise reads the clean CSVs. With upsert, the batch is merged into
+    the partitions it touches instead of replacing them. Returns the paths
+    of the transaction files written.
+    """
+    clean = clean or {}
+    if upsert:
+        combined = clean.get('combined')
+        if combined is None:
+            combined = pd.read_csv('data/clean/combined_data.csv')
+        written_files = upsert_time_partitioned_parquet(combined)
+    else:
+        written_files = create_time_partitioned_parquet(clean.get('combined'))
+    create_dimension_parquet(clean.get('trucks'), clean.get('payment'))
+    return written_files
 
 
 if __name__ == "__main__":
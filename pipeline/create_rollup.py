@@ -0,0 +1,127 @@
+"""
+Builds the additive rollup cube that dashboard and report queries are served from.
+One row per (transaction_date, hour_of_day, truck_id, payment_method_id) with
+transaction count, revenue and sum of squared revenue, partitioned by day.
+Incremental updates recompute each day a batch touches from that day's
+transaction partition instead of adding the batch to it, so a batch that is
+retried after a failure is never counted twice.
+"""
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pathlib import Path
+from create_parquet import PARTITIONING, add_partition_columns
+from telemetry import record_metrics
+from transform import lookup_dimension
+
+ROLLUP_DIR = 'data/rollup'
+GRAIN = ['transaction_date', 'hour_of_day', 'truck_id', 'payment_method_id']
+MEASURES = ['transaction_count', 'total_revenue', 'total_revenue_squared']
+TRUCK_ATTRIBUTES = ['truck_id', 'truck_name', 'fsa_rating', 'has_card_reader']
+
+
+def aggregate_transactions(combined):
+    """Aggregate transactions to the rollup grain."""
+    at = pd.to_datetime(combined['at'])
+    total = combined['total'].astype('int64')
+    frame = pd.DataFrame({
+        'transaction_date': at.dt.normalize(),
+        'hour_of_day': at.dt.hour.astype('int8'),
+        'truck_id': combined['truck_id'].astype('int32'),
+        'payment_method_id': combined['payment_method_id'].astype('int32'),
+        'total': total,
+        'total_squared': total ** 2
+    })
+    return frame.groupby(GRAIN, observed=True).agg(
+        transaction_count=('total', 'size'),
+        total_revenue=('total', 'sum'),
+        total_revenue_squared=('total_squared', 'sum')).reset_index()
+
+
+def merge_rollups(*rollups):
+    """Merge rollups by summing their measures, which is valid since all are additive."""
+    merged = pd.concat([rollup[GRAIN + MEASURES] for rollup in rollups], ignore_index=True)
+    return merged.groupby(GRAIN, observed=True)[MEASURES].sum().reset_index()
+
+
+def attach_attributes(rollup, trucks, payment):
+    """Attach day of week and the current truck and payment method attributes."""
+    return rollup.assign(
+        day_of_week=(rollup['transaction_date'].dt.dayofweek + 1).astype('int8'),
+        **lookup_dimension(rollup['truck_id'], trucks[TRUCK_ATTRIBUTES], 'truck_id'),
+        **lookup_dimension(rollup['payment_method_id'], payment, 'payment_method_id'))
+
+
+def get_day_partition_keys(combined):
+    """Get the sorted year=/month=/day= keys of the days a batch of transactions covers."""
+    return sorted(set(pd.to_datetime(combined['at']).dt.strftime('year=%Y/month=%m/day=%d')))
+
+
+def read_transaction_partitions(partition_keys, data_dir='data/parquet'):
+    """Read the columns the rollup needs from the given transaction partitions."""
+    files = [str(f) for key in partition_keys
+             for f in (Path(data_dir) / key).glob('*.parquet')]
+    return ds.dataset(files, format='parquet').to_table(
+        columns=['at', 'truck_id', 'payment_method_id', 'total']).to_pandas()
+
+
+def write_rollup(rollup):
+    """Write rollup rows, replacing the day partitions they cover."""
+    table = pa.Table.from_pandas(rollup, preserve_index=False)
+    table = table.set_column(
+        table.schema.get_field_index('transaction_date'), 'transaction_date',
+        pc.cast(table['transaction_date'], pa.date32()))
+    table = add_partition_columns(table, 'transaction_date')
+
+    written_files = []
+    ds.write_dataset(
+        table, ROLLUP_DIR, format='parquet',
+        partitioning=PARTITIONING,
+        basename_template='rollup-{i}.parquet',
+        existing_data_behavior='delete_matching',
+        max_partitions=100_000,
+        file_visitor=lambda written: written_files.append(written.path))
+    return written_files
+
+
+def update_rollup(combined, trucks, payment, rebuild=False):
+    """Update the rollup cube with a batch of combined transactions.
+
+    The days the batch touches are recomputed from their partitions in the
+    lake, which must already hold the batch; other days are left untouched.
+    With rebuild, the cube is cleared first and recomputed from the batch
+    alone.
+    """
+    if rebuild:
+        return apply_rollup(aggregate_transactions(combined), trucks, payment, rebuild)
+    return refresh_rollup(get_day_partition_keys(combined), trucks, payment)
+
+
+def refresh_rollup(partition_keys, trucks, payment, data_dir='data/parquet'):
+    """Recompute the rollup days of the given partitions from their transactions."""
+    if not partition_keys:
+        return []
+    transactions = read_transaction_partitions(partition_keys, data_dir)
+    return apply_rollup(aggregate_transactions(transactions), trucks, payment)
+
+
+def apply_rollup(rollup, trucks, payment, rebuild=False):
+    """Write aggregated rollup rows, replacing the days they cover."""
+    if rebuild:
+        shutil.rmtree(ROLLUP_DIR, ignore_errors=True)
+
+    dates = rollup['transaction_date'].drop_duplicates()
+    written_files = write_rollup(attach_attributes(rollup, trucks, payment))
+    record_metrics(rows_in=int(rollup['transaction_count'].sum()), rows_out=len(rollup))
+    print(f"✓ Updated rollup for {len(dates)} days "
+          f"({len(rollup)} rows, {len(written_files)} files)")
+    return written_files
+
+
+if __name__ == "__main__":
+    update_rollup(pd.read_csv('data/clean/combined_data.csv'),
+                  pd.read_csv('data/clean/trucks_clean.csv'),
+                  pd.read_csv('data/clean/payment_methods_clean.csv'),
+                  rebuild=True)
@@ -1,7 +1,28 @@
 import os
+import json
+import queue
+import resource
 import pymysql
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from telemetry import record_metrics
+
+DIMENSION_TABLES = ['DIM_Truck', 'DIM_Payment_Method']
+FACT_TABLE = 'FACT_Transaction'
+STATE_PATH = 'data/state/extract_state.json'
+STATE_KEY = 'inputs/_extract_state.json'
+FACT_SCHEMA = pa.schema([
+    ('transaction_id', pa.int64()),
+    ('truck_id', pa.int64()),
+    ('payment_method_id', pa.int64()),
+    ('total', pa.float64()),
+    ('at', pa.timestamp('us'))
+])
 
 
 def get_db_connection():
@@ -16,19 +37,280 @@ def get_db_connection():
     )
 
 
-def extract_tables():
-    """Extract tables from database to CSV files."""
-    connection = get_db_connection()
+def create_connection_pool(size):
+    """Open a fixed-size pool of database connections."""
+    pool = queue.Queue()
+    for _ in range(size):
+        pool.put(get_db_connection())
+    return pool
+
+
+@contextmanager
+def pooled_connection(pool):
+    """Borrow a connection from the pool for the duration of a block."""
+    connection = pool.get()
+    try:
+        yield connection
+    finally:
+        pool.put(connection)
+
+
+def close_connection_pool(pool):
+    """Close every connection in the pool."""
+    while not pool.empty():
+        pool.get_nowait().close()
+
+
+def is_incremental_mode():
+    """Check whether incremental extraction is enabled."""
+    load_dotenv()
+    return os.getenv('EXTRACT_MODE', 'full') == 'incremental'
+
+
+def is_streaming_mode():
+    """Check whether streaming FACT_Transaction extraction is enabled."""
+    load_dotenv()
+    return os.getenv('EXTRACT_STREAMING', 'false').lower() == 'true'
+
+
+def get_batch_size():
+    """Get the number of rows fetched per streaming batch."""
+    load_dotenv()
+    return int(os.getenv('EXTRACT_BATCH_SIZE', 50000))
+
+
+def get_worker_count():
+    """Get the number of parallel extract workers (and pooled connections)."""
+    load_dotenv()
+    return int(os.getenv('EXTRACT_WORKERS', 1))
+
+
+def get_peak_rss_mb():
+    """Get the peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_extract_state(path=STATE_PATH):
+    """Load the persisted watermark and dimension checksums."""
+    if not os.path.exists(path):
+        return {'transaction_id': 0, 'at': None, 'checksums': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_extract_state(state, path=STATE_PATH):
+    """Persist the watermark and dimension checksums atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_table_checksum(connection, table):
+    """Get the server-side checksum of a table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"CHECKSUM TABLE {table}")
+        return cursor.fetchone()[1]
+
+
+def extract_dimension_table(connection, table, state, incremental):
+    """Extract a dimension table, reusing the cached copy in incremental mode if unchanged.
+
+    Dimension CSVs are always written since they double as the cache that
+    unchanged checksums are served from.
+    """
+    checksum = get_table_checksum(connection, table)
+    path = f'data/raw/{table}.csv'
+    if incremental and state['checksums'].get(table) == checksum and os.path.exists(path):
+        print(f"✓ Skipped {table} (unchanged)")
+        return pd.read_csv(path)
+    df = pd.read_sql(f"SELECT * FROM {table}", connection)
+    df.to_csv(path, index=False)
+    state['checksums'][table] = checksum
+    print(f"✓ Saved {table}")
+    return df
+
+
+def extract_dimension_tables(pool, state, incremental, workers=1):
+    """Extract all dimension tables concurrently over pooled connections."""
+    def extract_with_pool(table):
+        with pooled_connection(pool) as connection:
+            return extract_dimension_table(connection, table, state, incremental)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(DIMENSION_TABLES, executor.map(extract_with_pool, DIMENSION_TABLES)))
+
+
+def build_fact_query(state, incremental):
+    """Build the FACT_Transaction query and its parameters."""
+    if incremental:
+        return (f"SELECT * FROM {FACT_TABLE} WHERE transaction_id > %s ORDER BY transaction_id",
+                (state['transaction_id'],))
+    return f"SELECT * FROM {FACT_TABLE}", None
+
+
+def update_watermark(state, max_transaction_id, max_at):
+    """Advance the watermark past the rows just extracted."""
+    state['transaction_id'] = max(state['transaction_id'], int(max_transaction_id))
+    state['at'] = max(filter(None, [state['at'], str(max_at)]))
+
+
+def remove_file(path):
+    """Remove a stale output file if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def save_fact_table(df, state, persist):
+    """Advance the watermark and, if persisting, write transactions to CSV."""
+    remove_file(f'data/raw/{FACT_TABLE}.parquet')
+    if persist:
+        df.to_csv(f'data/raw/{FACT_TABLE}.csv', index=False)
+
+    if len(df):
+        update_watermark(state, df['transaction_id'].max(), df['at'].max())
+    print(f"✓ Extracted {FACT_TABLE} ({len(df)} rows)")
+    return df
+
+
+def extract_fact_table(connection, state, incremental, persist=True):
+    """Extract transactions, only those past the watermark in incremental mode."""
+    query, params = build_fact_query(state, incremental)
+    return save_fact_table(pd.read_sql(query, connection, params=params), state, persist)
+
+
+def get_fact_id_ranges(connection, state, incremental, shards):
+    """Split the transaction_id range still to extract into contiguous shards."""
+    lower_bound = state['transaction_id'] if incremental else 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT MIN(transaction_id), MAX(transaction_id) FROM {FACT_TABLE} WHERE transaction_id > %s",
+            (lower_bound,))
+        min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return []
+
+    step = -(-(max_id - min_id + 1) // shards)
+    return [(start, min(start + step - 1, max_id))
+            for start in range(min_id, max_id + 1, step)]
+
+
+def read_fact_range(pool, id_range):
+    """Read one transaction_id shard over a pooled connection."""
+    with pooled_connection(pool) as connection:
+        return pd.read_sql(
+            f"SELECT * FROM {FACT_TABLE} WHERE transaction_id BETWEEN %s AND %s ORDER BY transaction_id",
+            connection, params=id_range)
+
+
+def extract_fact_table_parallel(pool, state, incremental, workers, persist=True):
+    """Extract transactions as transaction_id shards read by parallel workers.
+
+    Shards are reassembled in id order, so the output is deterministic.
+    """
+    with pooled_connection(pool) as connection:
+        id_ranges = get_fact_id_ranges(connection, state, incremental, workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = list(executor.map(
+            lambda id_range: read_fact_range(pool, id_range), id_ranges))
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=FACT_SCHEMA.names)
+    return save_fact_table(df, state, persist)
+
+
+def rows_to_record_batch(rows, column_names):
+    """Convert fetched rows into a typed Arrow record batch."""
+    columns = dict(zip(column_names, zip(*rows)))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name]).cast(field.type) for field in FACT_SCHEMA],
+        schema=FACT_SCHEMA)
+
+
+def stream_fact_table(connection, state, incremental, batch_size):
+    """Stream transactions to Parquet in fixed-size batches.
+
+    Uses an unbuffered server-side cursor so that peak memory is bounded by
+    batch_size rather than by the size of the table.
+    """
+    query, params = build_fact_query(state, incremental)
+    path = f'data/raw/{FACT_TABLE}.parquet'
+    total_rows = 0
+
+    with connection.cursor(pymysql.cursors.SSCursor) as cursor, \
+            pq.ParquetWriter(path, FACT_SCHEMA) as writer:
+        cursor.execute(query, params)
+        column_names = [column[0] for column in cursor.description]
+        while rows := cursor.fetchmany(batch_size):
+            batch = rows_to_record_batch(rows, column_names)
+            writer.write_batch(batch, row_group_size=batch_size)
+            update_watermark(state, pc.max(batch['transaction_id']).as_py(),
+                             pc.max(batch['at']).as_py())
+            total_rows += len(rows)
+
+    remove_file(f'data/raw/{FACT_TABLE}.csv')
+    record_metrics(rows_out=total_rows)
+    print(f"✓ Streamed {FACT_TABLE} ({total_rows} rows, "
+          f"batch size {batch_size}, peak RSS {get_peak_rss_mb():.0f} MB)")
+
+
+def iter_fact_chunks(connection, state, incremental, batch_size):
+    """Yield transactions as DataFrames of up to batch_size rows, advancing the watermark.
+
+    Uses an unbuffered server-side cursor like stream_fact_table, so rows
+    are only fetched as fast as the consumer takes chunks.
+    """
+    query, params = build_fact_query(state, incremental)
+    with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(query, params)
+        column_names = [column[0] for column in cursor.description]
+        while rows := cursor.fetchmany(batch_size):
+            chunk = rows_to_record_batch(rows, column_names).to_pandas()
+            update_watermark(state, chunk['transaction_id'].max(), chunk['at'].max())
+            yield chunk
+
+
+def extract_tables(incremental=False, streaming=False, workers=1, persist=True):
+    """Extract tables from database to CSV files.
+
+    In streaming mode FACT_Transaction is written to Parquet instead. With
+    more than one worker, tables are read concurrently over a connection pool
+    and FACT_Transaction is split into transaction_id shards. Without
+    persist, FACT_Transaction is only handed back in memory.
+
+    Returns the updated extract state and a dict of extracted DataFrames
+    (FACT_Transaction is None when it was streamed to disk). The caller
+    should persist the state with save_extract_state once the batch has
+    landed downstream.
+    """
     os.makedirs('data/raw', exist_ok=True)
+    state = load_extract_state()
+    pool = create_connection_pool(workers)
 
-    tables = ['DIM_Truck', 'DIM_Payment_Method', 'FACT_Transaction']
-    for table in tables:
-        df = pd.read_sql(f"SELECT * FROM {table}", connection)
-        df.to_csv(f'data/raw/{table}.csv', index=False)
-        print(f"✓ Saved {table}")
+    try:
+        tables = extract_dimension_tables(pool, state, incremental, workers)
+        if streaming:
+            with pooled_connection(pool) as connection:
+                stream_fact_table(connection, state,
+                                  incremental, get_batch_size())
+            tables[FACT_TABLE] = None
+        elif workers > 1:
+            tables[FACT_TABLE] = extract_fact_table_parallel(
+                pool, state, incremental, workers, persist)
+        else:
+            with pooled_connection(pool) as connection:
+                tables[FACT_TABLE] = extract_fact_table(
+                    connection, state, incremental, persist)
+    finally:
+        close_connection_pool(pool)
 
-    connection.close()
+    record_metrics(rows_out=sum(len(table) for table in tables.values() if table is not None))
+    return state, tables
 
 
 if __name__ == "__main__":
-    extract_tables()
+    state, _ = extract_tables(
+        is_incremental_mode(), is_streaming_mode(), get_worker_count())
+    save_extract_state(state)
@@ -0,0 +1,210 @@
+"""
+Synthetic data generator for testing the pipeline at production scale.
+Builds DIM_Truck, DIM_Payment_Method and FACT_Transaction tables of any size
+from the distributions in the sample extract under data/raw: each truck's
+share of sales, prices and payment mix, the hour-of-day profile and the
+spread of daily volume. Transactions are generated a day at a time and
+written in chunks as CSV, into SQLite or into the DB_* MySQL database, so
+100M-row tables never have to fit in memory.
+"""
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from contextlib import closing
+from dotenv import load_dotenv
+from extract import DIMENSION_TABLES, FACT_TABLE, get_db_connection
+
+TABLE_COLUMNS = {
+    'DIM_Truck': ('truck_id INT PRIMARY KEY, truck_name VARCHAR(255), '
+                  'truck_description VARCHAR(255), has_card_reader SMALLINT, '
+                  'fsa_rating SMALLINT'),
+    'DIM_Payment_Method': 'payment_method_id INT PRIMARY KEY, payment_method VARCHAR(50)',
+    'FACT_Transaction': ('transaction_id INT PRIMARY KEY, truck_id INT, '
+                         'payment_method_id INT, total DOUBLE, at DATETIME')
+}
+
+
+def get_generator_config():
+    """Get the size, shape, seed and destination of the synthetic data from environment."""
+    load_dotenv()
+    target = os.getenv('SYNTHETIC_TARGET', 'csv')
+    default_output = 'data/synthetic.db' if target == 'sqlite' else 'data/synthetic'
+    return {
+        'rows': int(float(os.getenv('SYNTHETIC_ROWS', 1_000_000))),
+        'trucks': int(os.getenv('SYNTHETIC_TRUCKS', 24)),
+        'days': int(os.getenv('SYNTHETIC_DAYS', 90)),
+        'start_date': os.getenv('SYNTHETIC_START_DATE', '2026-01-01'),
+        'seed': int(os.getenv('SYNTHETIC_SEED', 0)),
+        'chunk_rows': int(float(os.getenv('SYNTHETIC_CHUNK_ROWS', 1_000_000))),
+        'target': target,
+        'output': os.getenv('SYNTHETIC_OUTPUT', default_output)
+    }
+
+
+def get_distribution(values):
+    """Get the distinct values of a series and the share of each."""
+    shares = values.value_counts(normalize=True).sort_index()
+    return shares.index.to_numpy(), shares.to_numpy()
+
+
+def learn_profile(sample_dir='data/raw'):
+    """Learn the distributions to sample from the raw sample tables."""
+    trucks = pd.read_csv(Path(sample_dir) / 'DIM_Truck.csv')
+    payment = pd.read_csv(Path(sample_dir) / 'DIM_Payment_Method.csv')
+    transactions = pd.read_csv(Path(sample_dir) / f'{FACT_TABLE}.csv', parse_dates=['at'])
+    transactions = transactions[transactions['total'] > 0]
+
+    by_truck = transactions.groupby('truck_id')
+    trucks = trucks[trucks['truck_id'].isin(by_truck.groups)].reset_index(drop=True)
+    daily_counts = transactions.groupby(transactions['at'].dt.date).size()
+    hours = transactions['at'].dt.hour.value_counts().reindex(range(24), fill_value=0)
+    return {
+        'trucks': trucks,
+        'payment': payment,
+        'truck_shares': by_truck.size()[trucks['truck_id']].to_numpy() / len(transactions),
+        'prices': [get_distribution(by_truck.get_group(truck_id)['total'])
+                   for truck_id in trucks['truck_id']],
+        'payment_methods': [get_distribution(by_truck.get_group(truck_id)['payment_method_id'])
+                            for truck_id in trucks['truck_id']],
+        'hour_shares': (hours / hours.sum()).to_numpy(),
+        'daily_cv': daily_counts.std() / daily_counts.mean() if len(daily_counts) > 1 else 0
+    }
+
+
+def generate_trucks(profile, count, rng):
+    """Generate trucks modelled on the sample trucks, with each one's sales weight.
+
+    Truck i follows the prices and payment mix of sample truck i mod n,
+    and its name gains a fleet number after the first n trucks.
+    """
+    sample = profile['trucks']
+    templates = np.arange(count) % len(sample)
+    trucks = sample.iloc[templates].reset_index(drop=True)
+    fleet_numbers = np.arange(count) // len(sample) + 1
+    trucks['truck_name'] = [name if number == 1 else f'{name} {number}'
+                            for name, number in zip(trucks['truck_name'], fleet_numbers)]
+    trucks['truck_id'] = np.arange(1, count + 1)
+
+    weights = profile['truck_shares'][templates] * rng.lognormal(0, 0.25, count)
+    return trucks, templates, weights / weights.sum()
+
+
+def generate_day(profile, day, count, templates, truck_weights, rng):
+    """Generate one day's transactions in time order."""
+    minutes = np.sort(rng.choice(24, count, p=profile['hour_shares']) * 60
+                      + rng.integers(0, 60, count))
+    truck_index = rng.choice(len(templates), count, p=truck_weights)
+    truck_templates = templates[truck_index]
+
+    totals = np.empty(count)
+    payment_method_ids = np.empty(count, dtype='int64')
+    for template in np.unique(truck_templates):
+        mask = truck_templates == template
+        values, shares = profile['prices'][template]
+        totals[mask] = rng.choice(values, mask.sum(), p=shares)
+        values, shares = profile['payment_methods'][template]
+        payment_method_ids[mask] = rng.choice(values, mask.sum(), p=shares)
+
+    return pd.DataFrame({
+        'truck_id': truck_index + 1,
+        'payment_method_id': payment_method_ids,
+        'total': totals,
+        'at': pd.Timestamp(day) + pd.to_timedelta(minutes, unit='min')
+    })
+
+
+def generate_transactions(profile, templates, truck_weights, config, rng):
+    """Yield transactions in chunks of about chunk_rows, with ids increasing over time.
+
+    Daily volumes vary around the mean as much as the sample's do.
+    """
+    cv = profile['daily_cv']
+    day_weights = rng.gamma(1 / cv ** 2, size=config['days']) if cv else np.ones(config['days'])
+    day_counts = rng.multinomial(config['rows'], day_weights / day_weights.sum())
+    days = pd.date_range(config['start_date'], periods=config['days'], freq='D')
+
+    next_id, pending = 1, []
+    for i, (day, count) in enumerate(zip(days, day_counts)):
+        pending.append(generate_day(profile, day, count, templates, truck_weights, rng))
+        if sum(len(df) for df in pending) >= config['chunk_rows'] or i == len(days) - 1:
+            chunk = pd.concat(pending, ignore_index=True)
+            chunk.insert(0, 'transaction_id', np.arange(next_id, next_id + len(chunk)))
+            next_id += len(chunk)
+            pending = []
+            yield chunk
+
+
+def generate_tables(config, sample_dir='data/raw'):
+    """Generate the dimension tables and an iterator of transaction chunks."""
+    profile = learn_profile(sample_dir)
+    rng = np.random.default_rng(config['seed'])
+    trucks, templates, truck_weights = generate_trucks(profile, config['trucks'], rng)
+    tables = {'DIM_Truck': trucks, 'DIM_Payment_Method': profile['payment']}
+    return tables, generate_transactions(profile, templates, truck_weights, config, rng)
+
+
+def write_csv_tables(tables, chunks, output_dir):
+    """Write the tables as CSV files laid out like the raw extract."""
+    os.makedirs(output_dir, exist_ok=True)
+    for table in DIMENSION_TABLES:
+        tables[table].to_csv(Path(output_dir) / f'{table}.csv', index=False)
+    path = Path(output_dir) / f'{FACT_TABLE}.csv'
+    total_rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        total_rows += len(chunk)
+    return total_rows
+
+
+def insert_rows(connection, table, df, placeholder):
+    """Insert a DataFrame's rows into a database table."""
+    if 'at' in df:
+        df = df.assign(at=df['at'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    columns = ', '.join(df.columns)
+    values = ', '.join([placeholder] * len(df.columns))
+    with closing(connection.cursor()) as cursor:
+        cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({values})",
+                           df.astype(object).itertuples(index=False, name=None))
+
+
+def load_database_tables(connection, tables, chunks, placeholder):
+    """Recreate the tables in a database and load them, committing each chunk."""
+    with closing(connection.cursor()) as cursor:
+        for table, columns in TABLE_COLUMNS.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} ({columns})")
+    for table in DIMENSION_TABLES:
+        insert_rows(connection, table, tables[table], placeholder)
+    total_rows = 0
+    for chunk in chunks:
+        insert_rows(connection, FACT_TABLE, chunk, placeholder)
+        connection.commit()
+        total_rows += len(chunk)
+    return total_rows
+
+
+def write_synthetic_data(config, sample_dir='data/raw'):
+    """Generate synthetic tables and write them to the configured target."""
+    tables, chunks = generate_tables(config, sample_dir)
+    if config['target'] == 'csv':
+        total_rows = write_csv_tables(tables, chunks, config['output'])
+    elif config['target'] == 'sqlite':
+        Path(config['output']).parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(config['output'])) as connection:
+            total_rows = load_database_tables(connection, tables, chunks, '?')
+    elif config['target'] == 'mysql':
+        with closing(get_db_connection()) as connection:
+            total_rows = load_database_tables(connection, tables, chunks, '%s')
+    else:
+        raise ValueError(f"Unknown SYNTHETIC_TARGET: {config['target']}")
+
+    destination = 'the DB_* database' if config['target'] == 'mysql' else config['output']
+    print(f"✓ Generated {total_rows:,} transactions for {config['trucks']} trucks "
+          f"over {config['days']} days into {destination}")
+    return total_rows
+
+
+if __name__ == "__main__":
+    write_synthetic_data(get_generator_config())
@@ -0,0 +1,85 @@
+"""
+Persistent index of the transaction ids already landed in the lake.
+Ids are held as sorted, non-overlapping [start, end] ranges, which stay
+small for the mostly contiguous ids RDS assigns, and saved as a .npy file
+next to the transaction partitions, with a copy on S3 beside the uploaded
+ones that the pipeline restores at the start of each run. Testing a batch against the index is a
+single vectorized binary search, so deduplicating a batch costs the same
+however much history has landed.
+"""
+import os
+import numpy as np
+import pyarrow.dataset as ds
+from pathlib import Path
+
+INDEX_PATH = 'data/parquet/_landed_ids.npy'
+INDEX_KEY = 'inputs/transactions/_landed_ids.npy'
+
+
+def empty_index():
+    """Create an index holding no ids."""
+    return np.empty((0, 2), dtype='int64')
+
+
+def ids_to_ranges(ids):
+    """Collapse ids into sorted, inclusive [start, end] ranges of consecutive ids."""
+    ids = np.unique(np.asarray(ids, dtype='int64'))
+    if len(ids) == 0:
+        return empty_index()
+    breaks = np.flatnonzero(np.diff(ids) > 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(ids)]]) - 1
+    return np.column_stack([ids[starts], ids[ends]])
+
+
+def merge_ranges(*indexes):
+    """Merge indexes into one, joining ranges that overlap or touch."""
+    ranges = np.concatenate(indexes)
+    if len(ranges) == 0:
+        return empty_index()
+    ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+    reach = np.maximum.accumulate(ranges[:, 1])
+    group_starts = np.flatnonzero(np.concatenate([[True], ranges[1:, 0] > reach[:-1] + 1]))
+    return np.column_stack([ranges[group_starts, 0],
+                            np.maximum.reduceat(ranges[:, 1], group_starts)])
+
+
+def add_ids(index, ids):
+    """Return the index with ids added."""
+    return merge_ranges(index, ids_to_ranges(ids))
+
+
+def is_landed(index, ids):
+    """Return a boolean mask of the ids already in the index."""
+    ids = np.asarray(ids, dtype='int64')
+    if len(index) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    position = np.searchsorted(index[:, 0], ids, side='right') - 1
+    return (position >= 0) & (ids <= index[np.maximum(position, 0), 1])
+
+
+def build_landed_ids(data_dir='data/parquet'):
+    """Build the index from the transaction_id column of the landed partitions."""
+    files = [str(path) for path in Path(data_dir).glob('year=*/month=*/day=*/*.parquet')]
+    if not files:
+        return empty_index()
+    table = ds.dataset(files, format='parquet').to_table(columns=['transaction_id'])
+    return ids_to_ranges(table['transaction_id'].to_numpy())
+
+
+def load_landed_ids(path=INDEX_PATH, data_dir='data/parquet'):
+    """Load the index, building it from the landed partitions the first time."""
+    if os.path.exists(path):
+        return np.load(path)
+    index = build_landed_ids(data_dir)
+    print(f"✓ Built landed id index from {data_dir} ({len(index)} ranges)")
+    return index
+
+
+def save_landed_ids(index, path=INDEX_PATH):
+    """Persist the index atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, index)
+    os.replace(tmp_path, path)
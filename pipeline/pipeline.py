@@ -1,41 +1,280 @@
 """
 Main pipeline script that orchestrates the entire ETL process.
-Extracts data from RDS, transforms it, converts to Parquet, and uploads to S3.
+Extracts data from RDS, transforms it, converts to Parquet, updates the
+rollup cube, and uploads to S3.
 """
+import os
 import sys
-from extract import extract_tables
-from transform import transform_data
-from create_parquet import create_parquet_files
-from upload_to_s3 import upload_to_s3
+import queue
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from extract import (DIMENSION_TABLES, STATE_KEY, STATE_PATH,
+                     close_connection_pool, create_connection_pool,
+                     extract_dimension_tables,
+                     extract_tables, get_batch_size, get_worker_count,
+                     is_incremental_mode, is_streaming_mode, iter_fact_chunks,
+                     load_extract_state, pooled_connection, save_extract_state)
+from transform import clean_dimensions, transform_chunk, transform_data
+from create_parquet import (create_dimension_parquet, create_parquet_files,
+                            create_time_partitioned_parquet, matches_published_file,
+                            new_generation, publish_partition,
+                            upsert_time_partitioned_parquet)
+from create_rollup import (aggregate_transactions, apply_rollup, merge_rollups,
+                           refresh_rollup, update_rollup)
+from landed_ids import (INDEX_KEY, INDEX_PATH, add_ids, empty_index,
+                        load_landed_ids, save_landed_ids)
+from telemetry import record_metrics, stage_metrics
+from upload_to_s3 import (download_state_files, get_bucket_name, get_object_key,
+                          get_partition_key, get_s3_client, sync_directories,
+                          upload_state_files, upload_to_s3)
 
+END_OF_STREAM = object()
+STATE_FILES = {STATE_PATH: STATE_KEY, INDEX_PATH: INDEX_KEY}
 
-def run_pipeline():
-    """Run the complete ETL pipeline."""
-    try:
-        print("=" * 60)
-        print("STARTING FOOD TRUCKS DATA PIPELINE")
-        print("=" * 60)
 
-        print("\n[1/4] EXTRACTING DATA FROM RDS...")
-        extract_tables()
+class PipelineStageError(Exception):
+    """Raised when a pipeline stage fails, naming the stage."""
+
+    def __init__(self, stage, error):
+        super().__init__(f"{stage} failed: {error}")
+        self.stage = stage
+
+
+def is_persist_mode():
+    """Check whether intermediate CSVs should be written for debugging."""
+    load_dotenv()
+    return os.getenv('PIPELINE_PERSIST_CSV', 'false').lower() == 'true'
+
 
-        print("\n[2/4] TRANSFORMING AND CLEANING DATA...")
-        transform_data()
+def is_pipelined_mode():
+    """Check whether stages should run concurrently over chunks of transactions."""
+    load_dotenv()
+    return os.getenv('PIPELINE_PIPELINED', 'false').lower() == 'true'
 
-        print("\n[3/4] CREATING PARQUET FILES...")
-        create_parquet_files()
 
-        print("\n[4/4] UPLOADING TO S3...")
-        upload_to_s3()
+def get_queue_size():
+    """Get the number of chunks each inter-stage queue can hold."""
+    load_dotenv()
+    return int(os.getenv('PIPELINE_QUEUE_SIZE', 2))
 
-        print("\n" + "=" * 60)
-        print("✓ PIPELINE COMPLETE")
-        print("=" * 60)
 
+def run_stage(stage, func, *args):
+    """Run one stage under telemetry, wrapping any failure in a PipelineStageError."""
+    try:
+        with stage_metrics(stage):
+            return func(*args)
     except Exception as e:
-        print(f"\n✗ PIPELINE FAILED: {e}")
-        sys.exit(1)
+        raise PipelineStageError(stage, e) from e
+
+
+def put_chunk(chunks, item, stop):
+    """Put an item on a bounded queue, blocking while it is full unless the pipeline stops."""
+    while not stop.is_set():
+        try:
+            chunks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iter_queue(chunks, stop):
+    """Yield items from a queue until the end of the stream or until the pipeline stops."""
+    while not stop.is_set():
+        try:
+            item = chunks.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is END_OF_STREAM:
+            return
+        yield item
+
+
+def start_stage_thread(stage, work, inbox, outbox, stop, errors):
+    """Run work on a thread, feeding it from inbox and passing its outputs to outbox.
+
+    work takes an iterator of inputs (None for the first stage) and returns
+    an iterator of outputs. The first failure is recorded in errors and
+    stops every other stage. Telemetry covers the thread's whole run.
+    """
+    def run():
+        try:
+            with stage_metrics(stage, concurrent=True):
+                inputs = iter_queue(inbox, stop) if inbox is not None else None
+                for item in work(inputs):
+                    if outbox is not None and not put_chunk(outbox, item, stop):
+                        return
+                if outbox is not None:
+                    put_chunk(outbox, END_OF_STREAM, stop)
+        except Exception as e:
+            errors.append(PipelineStageError(stage, e))
+            stop.set()
+
+    thread = threading.Thread(target=run, name=f'pipeline-{stage}', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_partition_keys(written_files):
+    """Get the sorted year=/month=/day= keys of the partitions holding written files."""
+    return sorted({get_partition_key(Path(f)) for f in written_files})
+
+
+def run_pipelined(incremental):
+    """Run extract, transform, Parquet writing and upload concurrently over chunks.
+
+    Transactions flow in EXTRACT_BATCH_SIZE chunks through bounded queues,
+    so chunk N can upload while chunk N+1 is transformed and N+2 extracted,
+    and a slow stage holds back the ones before it. A full run writes its
+    chunks into a new generation of each partition, which readers do not
+    see until it is published once every chunk has landed: locally, and
+    then on S3 by the final upload, which points the catalog at the new
+    generations and removes the objects they replace. A failed run leaves
+    the previous data in place. Chunk files identical to the published
+    ones are not uploaded early, and a partition whose files are all
+    identical keeps its published generation. Incremental chunks are upserted into the
+    partitions they touch; since a later chunk may rewrite a partition an
+    earlier one wrote, those partitions are only uploaded in the final
+    upload. The rollup and dimension files are built once every chunk has
+    landed.
+    """
+    state = load_extract_state()
+    landed = load_landed_ids() if incremental else empty_index()
+    pool = create_connection_pool(1)
+    try:
+        tables = run_stage('extract_dimensions', extract_dimension_tables,
+                           pool, state, incremental)
+        trucks, payment = clean_dimensions(*(tables[table] for table in DIMENSION_TABLES))
+
+        bucket_name, s3_client = get_bucket_name(), get_s3_client()
+        generation = new_generation()
+        written_partitions, upserted_files = set(), set()
+        rollups, chunk_count = [], 0
+        stop, errors = threading.Event(), []
+        extracted, transformed, written = (queue.Queue(get_queue_size()) for _ in range(3))
+
+        def extract_chunks(_):
+            with pooled_connection(pool) as connection:
+                for chunk in iter_fact_chunks(connection, state, incremental, get_batch_size()):
+                    record_metrics(rows_out=len(chunk))
+                    yield chunk
+
+        def transform_chunks(chunks):
+            nonlocal landed
+            for chunk in chunks:
+                combined = transform_chunk(chunk, trucks, payment, landed)
+                landed = add_ids(landed, combined['transaction_id'])
+                record_metrics(rows_in=len(chunk), rows_out=len(combined))
+                yield combined
+
+        def write_chunks(chunks):
+            nonlocal chunk_count
+            for i, combined in enumerate(chunks):
+                chunk_count += 1
+                if incremental:
+                    upserted_files.update(upsert_time_partitioned_parquet(combined))
+                    continue
+                rollups.append(aggregate_transactions(combined))
+                written_files = create_time_partitioned_parquet(
+                    combined, file_prefix=f'transactions-c{i}', generation=generation)
+                written_partitions.update(get_partition_keys(written_files))
+                yield written_files
+
+        def upload_chunks(chunks):
+            for written_files in chunks:
+                local_files = {
+                    get_object_key(f, 'data/parquet', 'inputs/transactions/'): Path(f)
+                    for f in written_files if not matches_published_file(f)}
+                sync_directories(s3_client, bucket_name, local_files)
+            return iter(())
+
+        threads = [
+            start_stage_thread('extract', extract_chunks, None, extracted, stop, errors),
+            start_stage_thread('transform', transform_chunks, extracted, transformed, stop, errors),
+            start_stage_thread('parquet', write_chunks, transformed, written, stop, errors),
+            start_stage_thread('upload', upload_chunks, written, None, stop, errors)
+        ]
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    finally:
+        close_connection_pool(pool)
+
+    if incremental:
+        partitions = get_partition_keys(upserted_files)
+        print(f"✓ Pipelined {chunk_count} chunks into {len(partitions)} partitions")
+        run_stage('rollup', refresh_rollup, partitions, trucks, payment)
+    else:
+        partitions = None
+        unchanged = sum(publish_partition('data/parquet', partition, generation) != generation
+                        for partition in sorted(written_partitions))
+        print(f"✓ Pipelined {chunk_count} chunks into {len(written_partitions)} partitions "
+              f"({unchanged} unchanged)")
+        if rollups:
+            run_stage('rollup', apply_rollup, merge_rollups(*rollups), trucks, payment, True)
+    run_stage('dimensions', create_dimension_parquet, trucks, payment)
+    run_stage('upload_final', upload_to_s3, partitions)
+    save_landed_ids(landed)
+    save_extract_state(state)
+
+
+def run_sequential(incremental):
+    """Run each stage in turn over the whole batch."""
+    persist = is_persist_mode()
+    landed = load_landed_ids() if incremental else empty_index()
+    print(f"\n[1/5] EXTRACTING DATA FROM RDS ({'incremental' if incremental else 'full'})...")
+    state, tables = run_stage('extract', extract_tables, incremental,
+                              is_streaming_mode(), get_worker_count(), persist)
+
+    print("\n[2/5] TRANSFORMING AND CLEANING DATA...")
+    clean = run_stage('transform', transform_data, tables, persist, landed)
+
+    print(f"\n[3/5] {'UPSERTING' if incremental else 'CREATING'} PARQUET FILES...")
+    written_files = run_stage('parquet', create_parquet_files, clean, incremental)
+
+    print("\n[4/5] UPDATING ROLLUP CUBE...")
+    run_stage('rollup', update_rollup, clean['combined'], clean['trucks'],
+              clean['payment'], not incremental)
+
+    print("\n[5/5] UPLOADING TO S3...")
+    run_stage('upload', upload_to_s3,
+              get_partition_keys(written_files) if incremental else None)
+    save_landed_ids(add_ids(landed, clean['transactions']['transaction_id']))
+    save_extract_state(state)
+
+
+def run_pipeline():
+    """Run the complete ETL pipeline.
+
+    Raises PipelineStageError naming the stage that failed; the extract
+    watermark and landed id index are only saved once every stage has
+    succeeded. They are restored from S3 before the run and saved back
+    after it, as the ECS task starts each run on a fresh disk.
+    """
+    print("=" * 60)
+    print("STARTING FOOD TRUCKS DATA PIPELINE")
+    print("=" * 60)
+
+    bucket_name = get_bucket_name()
+    download_state_files(bucket_name, STATE_FILES)
+    incremental = is_incremental_mode()
+    if is_pipelined_mode():
+        print(f"\nRUNNING PIPELINED STAGES ({'incremental' if incremental else 'full'})...")
+        run_pipelined(incremental)
+    else:
+        run_sequential(incremental)
+    upload_state_files(bucket_name, STATE_FILES)
+
+    print("\n" + "=" * 60)
+    print("✓ PIPELINE COMPLETE")
+    print("=" * 60)
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    try:
+        run_pipeline()
+    except PipelineStageError as e:
+        print(f"\n✗ PIPELINE FAILED: {e}")
+        sys.exit(1)
@@ -0,0 +1,117 @@
+"""
+Glue catalog registration for the partitions the pipeline uploads.
+Points each uploaded year=/month=/day= partition of the transactions and
+rollup tables at the S3 directory holding its files right after upload:
+new days are added with BatchCreatePartition, so they are queryable in
+Athena immediately rather than after the next crawl, and existing ones are
+moved with BatchUpdatePartition, which is how a rewritten transaction
+partition switches to its new generation in one step. The transactions
+table is defined in Terraform and cannot be crawled or repaired with MSCK;
+a full upload re-registers every partition instead. The rollup crawler
+remains the fallback for creating the rollup table and for schema changes.
+"""
+import os
+import copy
+import boto3
+from dotenv import load_dotenv
+
+BATCH_SIZE = 100  # BatchCreatePartition limit
+
+
+def get_catalog_config():
+    """Get the Glue database, the table behind each upload prefix and the on/off flag."""
+    load_dotenv()
+    return {
+        'enabled': os.getenv('GLUE_REGISTER_PARTITIONS', 'true').lower() == 'true',
+        'database': os.getenv('ATHENA_DATABASE', 'c21_nathan_t3_food_trucks_db'),
+        'tables': {
+            'inputs/transactions/': os.getenv('GLUE_TRANSACTIONS_TABLE', 'transactions'),
+            'inputs/rollup/': os.getenv('ROLLUP_TABLE', 'rollup')
+        }
+    }
+
+
+def get_glue_client():
+    """Create a Glue client."""
+    load_dotenv()
+    return boto3.client('glue')
+
+
+def get_partition_locations(keys, prefix):
+    """Map the year=/month=/day= partition of each object under a prefix to its directory."""
+    locations = {}
+    for key in keys:
+        if not key.startswith(prefix):
+            continue
+        parts = key[len(prefix):].split('/')
+        year_idx = next((i for i, part in enumerate(parts) if part.startswith('year=')), None)
+        if year_idx is not None:
+            locations['/'.join(parts[year_idx:year_idx + 3])] = f"{key.rsplit('/', 1)[0]}/"
+    return dict(sorted(locations.items()))
+
+
+def build_partition_input(storage_descriptor, location, partition):
+    """Build a partition from the table's storage descriptor at its own location."""
+    descriptor = copy.deepcopy(storage_descriptor)
+    descriptor['Location'] = location
+    values = [part.split('=', 1)[1] for part in partition.split('/')]
+    return {'Values': values, 'StorageDescriptor': descriptor}
+
+
+def raise_for_errors(response, table, ignored_code=None):
+    """Raise if a batch call failed for any partition other than with the ignored error code."""
+    failures = [error for error in response.get('Errors', [])
+                if error['ErrorDetail']['ErrorCode'] != ignored_code]
+    if failures:
+        raise RuntimeError(f"Failed to register {table} partitions: {failures}")
+
+
+def register_partitions(glue_client, database, table, bucket_name, locations):
+    """Register partitions with a Glue table in batches, moving existing ones to their new location.
+
+    locations maps each year=/month=/day= partition to the key prefix
+    holding its files. Partitions copy the table's storage descriptor, as
+    the crawler would create them. A table not in the catalog yet is
+    skipped.
+    """
+    try:
+        storage_descriptor = glue_client.get_table(
+            DatabaseName=database, Name=table)['Table']['StorageDescriptor']
+    except glue_client.exceptions.EntityNotFoundException:
+        print(f"✓ Skipped registering {table} partitions (table not in catalog yet)")
+        return
+
+    partition_inputs = [
+        build_partition_input(storage_descriptor, f's3://{bucket_name}/{location}', partition)
+        for partition, location in locations.items()]
+    existing = []
+    for i in range(0, len(partition_inputs), BATCH_SIZE):
+        batch = partition_inputs[i:i + BATCH_SIZE]
+        response = glue_client.batch_create_partition(
+            DatabaseName=database, TableName=table, PartitionInputList=batch)
+        raise_for_errors(response, table, 'AlreadyExistsException')
+        already_exists = [tuple(error['PartitionValues']) for error in response.get('Errors', [])]
+        existing += [partition_input for partition_input in batch
+                     if tuple(partition_input['Values']) in already_exists]
+
+    for i in range(0, len(existing), BATCH_SIZE):
+        response = glue_client.batch_update_partition(
+            DatabaseName=database, TableName=table,
+            Entries=[{'PartitionValueList': partition_input['Values'],
+                      'PartitionInput': partition_input}
+                     for partition_input in existing[i:i + BATCH_SIZE]])
+        raise_for_errors(response, table)
+    print(f"✓ Registered {len(partition_inputs) - len(existing)} new {table} partitions "
+          f"({len(existing)} updated)")
+
+
+def register_uploaded_partitions(bucket_name, uploaded_keys, glue_client=None):
+    """Point the partitions of uploaded transaction and rollup objects at the directories holding them."""
+    config = get_catalog_config()
+    if not config['enabled'] or not uploaded_keys:
+        return
+    glue_client = glue_client or get_glue_client()
+    for prefix, table in config['tables'].items():
+        locations = get_partition_locations(uploaded_keys, prefix)
+        if locations:
+            register_partitions(glue_client, config['database'], table, bucket_name, locations)
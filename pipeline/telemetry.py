@@ -0,0 +1,170 @@
+"""
+Per-stage telemetry for the ETL pipeline.
+Records wall and CPU time, rows in and out, files in and out, bytes read and
+written and peak RSS for each stage, and emits them as structured JSON or
+CloudWatch Embedded Metric Format log lines. One stage can be profiled with cProfile.
+"""
+import os
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+METRICS_NAMESPACE = 'T3FoodTrucks/Pipeline'
+METRIC_UNITS = {
+    'wall_s': 'Seconds',
+    'cpu_s': 'Seconds',
+    'rows_in': 'Count',
+    'rows_out': 'Count',
+    'rows_skipped': 'Count',
+    'files_in': 'Count',
+    'files_out': 'Count',
+    'bytes_read': 'Bytes',
+    'bytes_written': 'Bytes',
+    'peak_rss_mb': 'Megabytes'
+}
+
+_current = threading.local()
+
+
+def get_telemetry_config():
+    """Get the metrics format and destination and the stage to profile from environment."""
+    load_dotenv()
+    return {
+        'format': os.getenv('PIPELINE_METRICS_FORMAT', 'json'),
+        'path': os.getenv('PIPELINE_METRICS_PATH'),
+        'profile_stage': os.getenv('PIPELINE_PROFILE_STAGE'),
+        'profile_dir': os.getenv('PIPELINE_PROFILE_DIR', 'data/profiles')
+    }
+
+
+def read_io_counters(concurrent):
+    """Read the bytes read and written so far by this process, or this thread if concurrent.
+
+    Counts every read and write system call, including sockets, so database
+    and S3 traffic are included. Returns None where /proc is unavailable.
+    """
+    path = '/proc/thread-self/io' if concurrent else '/proc/self/io'
+    try:
+        with open(path) as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(counters['rchar']), int(counters['wchar'])
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS mark so the next reading covers only this stage."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def read_peak_rss_mb(was_reset):
+    """Read the peak RSS since the last reset, or of the whole process otherwise."""
+    if was_reset:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def record_metrics(**counts):
+    """Add row, file or byte counts to the stage running on this thread, if any."""
+    metrics = getattr(_current, 'metrics', None)
+    if metrics is not None:
+        for name, value in counts.items():
+            metrics[name] = metrics.get(name, 0) + value
+
+
+def to_emf(metrics):
+    """Format stage metrics as a CloudWatch Embedded Metric Format document."""
+    values = {name: metrics[name] for name in METRIC_UNITS if metrics.get(name) is not None}
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['stage']],
+                'Metrics': [{'Name': name, 'Unit': METRIC_UNITS[name]} for name in values]
+            }]
+        },
+        'stage': metrics['stage'],
+        'status': metrics['status'],
+        **values
+    }
+
+
+def emit_metrics(metrics, config):
+    """Print stage metrics as one JSON log line and append them to the metrics file if set."""
+    if config['format'] == 'off':
+        return
+    document = to_emf(metrics) if config['format'] == 'emf' else metrics
+    print(json.dumps(document))
+    if config['path']:
+        os.makedirs(os.path.dirname(config['path']) or '.', exist_ok=True)
+        with open(config['path'], 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
+
+
+def save_profile(profiler, stage, profile_dir):
+    """Save a stage profile in pstats format and print its top functions."""
+    Path(profile_dir).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    path = Path(profile_dir) / f'{stage}-{timestamp}.prof'
+    profiler.dump_stats(path)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    print(f"✓ Saved {stage} profile to {path}")
+
+
+@contextmanager
+def stage_metrics(stage, concurrent=False):
+    """Measure a pipeline stage and emit its metrics when it finishes.
+
+    Code in the stage adds row, file and byte counts with record_metrics. With
+    concurrent, CPU time and I/O are those of the calling thread and peak
+    RSS is the process peak, since stages share the process. If
+    PIPELINE_PROFILE_STAGE names this stage, it runs under cProfile.
+    """
+    config = get_telemetry_config()
+    metrics = {'stage': stage, 'rows_in': 0, 'rows_out': 0}
+    _current.metrics = metrics
+    rss_was_reset = not concurrent and reset_peak_rss()
+    io_start = read_io_counters(concurrent)
+    cpu_clock = time.thread_time if concurrent else time.process_time
+    start_wall, start_cpu = time.perf_counter(), cpu_clock()
+
+    profiler = cProfile.Profile() if config['profile_stage'] == stage else None
+    if profiler:
+        profiler.enable()
+    metrics['status'] = 'failed'
+    try:
+        yield metrics
+        metrics['status'] = 'succeeded'
+    finally:
+        if profiler:
+            profiler.disable()
+        io_end = read_io_counters(concurrent)
+        metrics.update({
+            'wall_s': round(time.perf_counter() - start_wall, 3),
+            'cpu_s': round(cpu_clock() - start_cpu, 3),
+            'peak_rss_mb': round(read_peak_rss_mb(rss_was_reset), 1),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        })
+        if io_start and io_end:
+            metrics.setdefault('bytes_read', io_end[0] - io_start[0])
+            metrics.setdefault('bytes_written', io_end[1] - io_start[1])
+        _current.metrics = None
+        emit_metrics(metrics, config)
+        if profiler:
+            save_profile(profiler, stage, config['profile_dir'])
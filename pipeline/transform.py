@@ -1,31 +1,134 @@
 import os
+import numpy as np
 import pandas as pd
+from landed_ids import empty_index, is_landed
+from telemetry import record_metrics
 
+TRUCK_SCHEMA = {
+    'truck_id': 'int32',
+    'truck_name': 'category',
+    'truck_description': 'category',
+    'has_card_reader': 'Int8',
+    'fsa_rating': 'Int8'
+}
+PAYMENT_SCHEMA = {
+    'payment_method_id': 'int32',
+    'payment_method': 'category'
+}
+TRANSACTION_SCHEMA = {
+    'transaction_id': 'int32',
+    'truck_id': 'int32',
+    'payment_method_id': 'int32',
+    'total': 'int32'
+}
 
-def load_raw_data():
-    """Load and deduplicate raw data."""
-    trucks = pd.read_csv(
-        'data/raw/DIM_Truck.csv').drop_duplicates(subset=['truck_id'])
-    payment = pd.read_csv(
-        'data/raw/DIM_Payment_Method.csv').drop_duplicates(subset=['payment_method_id'])
-    transactions = pd.read_csv(
-        'data/raw/FACT_Transaction.csv').drop_duplicates(subset=['transaction_id'])
+
+def read_raw_transactions():
+    """Read raw transactions from the streamed Parquet file or the CSV."""
+    if os.path.exists('data/raw/FACT_Transaction.parquet'):
+        return pd.read_parquet('data/raw/FACT_Transaction.parquet')
+    return pd.read_csv('data/raw/FACT_Transaction.csv')
+
+
+def load_raw_data(tables=None):
+    """Load and deduplicate raw data.
+
+    Uses the DataFrames handed over by extract when given, and falls back to
+    the raw files on disk for anything missing.
+    """
+    tables = tables or {}
+    trucks = tables.get('DIM_Truck')
+    if trucks is None:
+        trucks = pd.read_csv('data/raw/DIM_Truck.csv')
+    payment = tables.get('DIM_Payment_Method')
+    if payment is None:
+        payment = pd.read_csv('data/raw/DIM_Payment_Method.csv')
+    transactions = tables.get('FACT_Transaction')
+    if transactions is None:
+        transactions = read_raw_transactions()
+
+    trucks, payment = clean_dimensions(trucks, payment)
+    transactions = transactions.drop_duplicates(subset=['transaction_id'])
     return trucks, payment, transactions
 
 
+def clean_dimensions(trucks, payment):
+    """Deduplicate the dimension tables and cast them to their compact schemas."""
+    trucks = clean_dimension(
+        trucks.drop_duplicates(subset=['truck_id']), TRUCK_SCHEMA)
+    payment = clean_dimension(
+        payment.drop_duplicates(subset=['payment_method_id']), PAYMENT_SCHEMA)
+    return trucks, payment
+
+
+def clean_dimension(dimension, schema):
+    """Cast a dimension table to its compact schema."""
+    return dimension.astype({column: dtype for column, dtype in schema.items()
+                             if column in dimension.columns})
+
+
 def clean_transactions(transactions):
-    """Clean transaction data."""
+    """Clean transaction data and cast it to the compact schema.
+
+    total is held in integer pence.
+    """
     transactions['at'] = pd.to_datetime(transactions['at'])
     transactions['total'] = pd.to_numeric(
         transactions['total'], errors='coerce')
     transactions = transactions[transactions['total'] > 0].dropna(
         subset=['transaction_id', 'truck_id', 'total', 'at'])
-    return transactions
+    transactions = transactions.assign(total=transactions['total'].round())
+    return transactions.astype(TRANSACTION_SCHEMA).reset_index(drop=True)
+
+
+def lookup_dimension(keys, dimension, key):
+    """Look up dimension attributes for each key with an id-indexed array.
+
+    Keys missing from the dimension get null attributes, as with a left merge.
+    """
+    ids = dimension[key].to_numpy()
+    index = np.full(ids.max() + 1 if len(ids) else 0, -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+
+    keys = keys.to_numpy()
+    known = (keys >= 0) & (keys < len(index))
+    positions = np.full(len(keys), -1, dtype=np.int64)
+    positions[known] = index[keys[known]]
+
+    return {column: dimension[column].array.take(positions, allow_fill=True)
+            for column in dimension.columns if column != key}
+
+
+def drop_landed(transactions, landed):
+    """Drop transactions whose ids are already in the landed id index.
+
+    Landed transactions are treated as immutable: a corrected row for a
+    landed id is dropped too, so it never reaches the upsert. Corrections
+    need a full run. Dropped rows are counted as the stage's rows_skipped,
+    so corrections that never land show up in telemetry.
+    """
+    mask = is_landed(landed, transactions['transaction_id'].to_numpy())
+    record_metrics(rows_skipped=int(mask.sum()))
+    if mask.any():
+        print(f"✓ Skipped {mask.sum()} already-landed transactions")
+    return transactions[~mask].reset_index(drop=True)
 
 
 def create_combined_dataset(transactions, trucks, payment):
-    """Merge all tables into combined dataset."""
-    return transactions.merge(trucks, on='truck_id', how='left').merge(payment, on='payment_method_id', how='left')
+    """Attach truck and payment method attributes to every transaction."""
+    return transactions.assign(
+        **lookup_dimension(transactions['truck_id'], trucks, 'truck_id'),
+        **lookup_dimension(transactions['payment_method_id'], payment, 'payment_method_id'))
+
+
+def transform_chunk(transactions, trucks, payment, landed=None):
+    """Clean one chunk of transactions and attach the cleaned dimension attributes.
+
+    Duplicates are removed within the chunk and against the landed id index.
+    """
+    transactions = clean_transactions(transactions.drop_duplicates(subset=['transaction_id']))
+    transactions = drop_landed(transactions, empty_index() if landed is None else landed)
+    return create_combined_dataset(transactions, trucks, payment)
 
 
 def save_clean_data(trucks, payment, transactions, combined):
@@ -37,14 +140,30 @@ def save_clean_data(trucks, payment, transactions, combined):
     combined.to_csv('data/clean/combined_data.csv', index=False)
 
 
-def transform_data():
-    """Main transformation pipeline."""
-    trucks, payment, transactions = load_raw_data()
+def transform_data(tables=None, persist=True, landed=None):
+    """Main transformation pipeline.
+
+    Returns the cleaned tables so the next stage can use them in memory.
+    Transactions whose ids are in the landed id index are dropped, so a
+    batch that overlaps earlier ones lands only its new rows. Clean CSVs
+    are only written when persist is set.
+    """
+    trucks, payment, transactions = load_raw_data(tables)
+    record_metrics(rows_in=len(transactions))
     transactions = clean_transactions(transactions)
+    transactions = drop_landed(transactions, empty_index() if landed is None else landed)
     combined = create_combined_dataset(transactions, trucks, payment)
-    save_clean_data(trucks, payment, transactions, combined)
+    record_metrics(rows_out=len(combined))
+    if persist:
+        save_clean_data(trucks, payment, transactions, combined)
     print(
         f"✓ Cleaned {len(trucks)} trucks, {len(payment)} payment methods, {len(transactions)} transactions")
+    return {
+        'trucks': trucks,
+        'payment': payment,
+        'transactions': transactions,
+        'combined': combined
+    }
 
 
 if __name__ == "__main__":
@@ -1,8 +1,18 @@
 import os
-import awswrangler as wr
-import pandas as pd
+import json
+import hashlib
+import boto3
 from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
+from create_parquet import GENERATIONS_DIR
+from register_partitions import register_uploaded_partitions
+from telemetry import record_metrics
+
+MANIFEST_PATH = 'data/state/upload_manifest.json'
+DATA_VERSION_KEY = 'inputs/_data_version.json'
 
 
 def get_bucket_name():
@@ -11,38 +21,302 @@ def get_bucket_name():
     return os.getenv('S3_BUCKET_NAME')
 
 
-def upload_time_partitioned_data(bucket_name):
-    """Uploads time-partitioned parquet files to S3."""
-    parquet_files = list(
-        Path('data/parquet').glob('year=*/month=*/day=*/transactions.parquet'))
+def get_s3_client():
+    """Create an S3 client, honouring S3_ENDPOINT_URL for local stand-ins."""
+    load_dotenv()
+    return boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL'))
+
+
+def get_upload_config():
+    """Get upload concurrency and multipart settings from environment."""
+    load_dotenv()
+    workers = int(os.getenv('UPLOAD_WORKERS', 8))
+    threshold = int(os.getenv('UPLOAD_MULTIPART_THRESHOLD_MB', 64)) * 1024 ** 2
+    return {
+        'workers': workers,
+        'transfer': TransferConfig(multipart_threshold=threshold,
+                                   multipart_chunksize=threshold,
+                                   max_concurrency=4)
+    }
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest of previously uploaded objects."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Persist the upload manifest atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def get_fingerprint(local_file, entry=None):
+    """Get size, mtime and MD5 of a file, reusing the MD5 if size and mtime match."""
+    stat = local_file.stat()
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if entry and all(entry.get(k) == v for k, v in fingerprint.items()):
+        return {**fingerprint, 'md5': entry['md5']}
+
+    md5 = hashlib.md5()
+    with open(local_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return {**fingerprint, 'md5': md5.hexdigest()}
+
+
+def list_remote_etags(s3_client, bucket_name, prefix):
+    """List the ETag of every object under a prefix."""
+    etags = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            etags[obj['Key']] = obj['ETag']
+    return etags
+
+
+def delete_objects(s3_client, bucket_name, keys):
+    """Delete objects in batches of 1000."""
+    for i in range(0, len(keys), 1000):
+        s3_client.delete_objects(Bucket=bucket_name, Delete={
+            'Objects': [{'Key': key} for key in keys[i:i + 1000]]})
+
+
+def sync_files(s3_client, bucket_name, local_files, prefix, delete_stale=False):
+    """Upload local files to S3, skipping any the manifest shows are unchanged.
+
+    A file is skipped when its MD5 matches the manifest and the remote ETag
+    still matches the one recorded at upload time. The Parquet bytes are
+    streamed as-is through a bounded thread pool. With delete_stale, remote
+    objects in the same directories as the local files but not present
+    locally are removed.
+    """
+    config = get_upload_config()
+    manifest = load_manifest()
+    remote_etags = list_remote_etags(s3_client, bucket_name, prefix)
+
+    pending = []
+    for key, local_file in local_files.items():
+        entry = manifest.get(key)
+        fingerprint = get_fingerprint(local_file, entry)
+        if entry and entry['md5'] == fingerprint['md5'] and remote_etags.get(key) == entry['etag']:
+            continue
+        pending.append((key, local_file, fingerprint))
+
+    def upload(item):
+        key, local_file, fingerprint = item
+        s3_client.upload_file(str(local_file), bucket_name, key,
+                              Config=config['transfer'])
+        etag = s3_client.head_object(Bucket=bucket_name, Key=key)['ETag']
+        return key, {**fingerprint, 'etag': etag}
+
+    with ThreadPoolExecutor(max_workers=config['workers']) as executor:
+        for key, entry in executor.map(upload, pending):
+            manifest[key] = entry
+            print(f"✓ Uploaded {key}")
+
+    if delete_stale:
+        directories = {key.rsplit('/', 1)[0] for key in local_files}
+        stale_keys = [key for key in remote_etags
+                      if key.rsplit('/', 1)[0] in directories and key not in local_files]
+        delete_objects(s3_client, bucket_name, stale_keys)
+        for key in stale_keys:
+            manifest.pop(key, None)
+        if stale_keys:
+            print(f"✓ Removed {len(stale_keys)} stale objects")
+
+    save_manifest(manifest)
+    record_metrics(files_in=len(local_files), files_out=len(pending))
+    print(f"✓ {len(pending)} uploaded, {len(local_files) - len(pending)} unchanged")
+    return [key for key, _, _ in pending]
+
+
+def get_partition_key(local_file):
+    """Get the year=/month=/day= key of a local partition file."""
+    parts = local_file.parts
+    year_idx = next(i for i, p in enumerate(
+        parts) if p.startswith('year='))
+    return '/'.join(parts[year_idx:year_idx + 3])
 
-    for local_file in parquet_files:
-        parts = local_file.parts
-        year_idx = next(i for i, p in enumerate(
-            parts) if p.startswith('year='))
-        year, month, day = parts[year_idx], parts[year_idx +
-                                                  1], parts[year_idx + 2]
 
-        s3_path = f"s3://{bucket_name}/inputs/transactions/{year}/{month}/{day}/transactions.parquet"
-        df = pd.read_parquet(local_file)
-        wr.s3.to_parquet(df=df, path=s3_path, index=False)
-        print(f"✓ Uploaded {year}/{month}/{day}")
+def get_object_key(local_file, local_dir, prefix):
+    """Get the S3 key of a local file, following partition links to the generation holding it."""
+    return f"{prefix}{Path(local_file).resolve().relative_to(Path(local_dir).resolve()).as_posix()}"
 
 
-def upload_dimension_tables(bucket_name):
+def sync_directories(s3_client, bucket_name, local_files):
+    """Sync local files directory by directory, listing only the directories they go to."""
+    directories = {}
+    for key, local_file in local_files.items():
+        directories.setdefault(f"{key.rsplit('/', 1)[0]}/", {})[key] = local_file
+    uploaded = []
+    for directory, directory_files in sorted(directories.items()):
+        uploaded += sync_files(s3_client, bucket_name, directory_files, directory)
+    return uploaded
+
+
+def list_partition_objects(s3_client, bucket_name, prefix, partitions):
+    """List the ETag of every object of the given partitions, in any generation."""
+    etags = {}
+    for partition in partitions:
+        for partition_prefix in (f'{prefix}{partition}/', f'{prefix}{GENERATIONS_DIR}/{partition}/'):
+            etags.update(list_remote_etags(s3_client, bucket_name, partition_prefix))
+    return etags
+
+
+def remove_superseded_objects(s3_client, bucket_name, current_keys, prefix, partitions=None):
+    """Delete the objects of the current keys' partitions that are not current.
+
+    Covers older generations, generations a failed run uploaded but never
+    published and objects left by the in-place layout. Given a list of
+    partition keys, only those partitions are listed.
+    """
+    current_partitions = {get_partition_key(Path(key)) for key in current_keys}
+    if partitions is None:
+        remote_etags = list_remote_etags(s3_client, bucket_name, prefix)
+    else:
+        remote_etags = list_partition_objects(s3_client, bucket_name, prefix, partitions)
+    stale_keys = [key for key in remote_etags
+                  if key not in current_keys and '/year=' in key
+                  and get_partition_key(Path(key)) in current_partitions]
+    if not stale_keys:
+        return
+
+    delete_objects(s3_client, bucket_name, stale_keys)
+    manifest = load_manifest()
+    for key in stale_keys:
+        manifest.pop(key, None)
+    save_manifest(manifest)
+    print(f"✓ Removed {len(stale_keys)} superseded objects")
+
+
+def upload_time_partitioned_data(bucket_name, s3_client=None, partitions=None, glue_client=None):
+    """Uploads time-partitioned parquet files to S3 and publishes them.
+
+    Each partition's current generation is uploaded under its own prefix,
+    which Athena does not read until the partition's Glue location points
+    at it. Superseded objects are deleted only after that, so a query sees
+    either the old file set or the new one and never both. Given a list of
+    year=/month=/day= partition keys, only those partitions are listed and
+    synced, so the cost follows the partitions a batch rewrote rather than
+    the size of the lake.
+    """
+    s3_client = s3_client or get_s3_client()
+    prefix = 'inputs/transactions/'
+    if partitions is None:
+        local_paths = Path('data/parquet').glob('year=*/month=*/day=*/*.parquet')
+    else:
+        local_paths = [local_file for partition in partitions
+                       for local_file in Path('data/parquet', partition).glob('*.parquet')]
+    local_files = {get_object_key(local_file, 'data/parquet', prefix): local_file
+                   for local_file in local_paths}
+
+    if partitions is None:
+        uploaded = sync_files(s3_client, bucket_name, local_files, prefix)
+    else:
+        uploaded = sync_directories(s3_client, bucket_name, local_files)
+
+    register_uploaded_partitions(bucket_name, list(local_files), glue_client)
+    remove_superseded_objects(s3_client, bucket_name, local_files, prefix, partitions)
+    return uploaded
+
+
+def upload_rollup_data(bucket_name, s3_client=None, glue_client=None):
+    """Uploads the day-partitioned rollup cube to S3 and registers its partitions.
+
+    Every local partition is registered, not just those uploaded this run,
+    so a partition whose registration failed after its upload is picked up
+    by the next run even though its files are unchanged.
+    """
+    s3_client = s3_client or get_s3_client()
+    prefix = 'inputs/rollup/'
+    local_files = {
+        f"{prefix}{get_partition_key(local_file)}/{local_file.name}": local_file
+        for local_file in Path('data/rollup').glob('year=*/month=*/day=*/*.parquet')
+    }
+    uploaded = sync_files(s3_client, bucket_name, local_files, prefix, delete_stale=True)
+    register_uploaded_partitions(bucket_name, list(local_files), glue_client)
+    return uploaded
+
+
+def upload_dimension_tables(bucket_name, s3_client=None):
     """Uploads dimension table parquet files to S3."""
-    for local_file in Path('data/parquet/dimensions').glob('*.parquet'):
-        s3_path = f"s3://{bucket_name}/inputs/dimensions/{local_file.name}"
-        df = pd.read_parquet(local_file)
-        wr.s3.to_parquet(df=df, path=s3_path, index=False)
-        print(f"✓ Uploaded {local_file.name}")
+    s3_client = s3_client or get_s3_client()
+    prefix = 'inputs/dimensions/'
+    local_files = {f"{prefix}{local_file.name}": local_file
+                   for local_file in Path('data/parquet/dimensions').glob('*.parquet')}
+    return sync_files(s3_client, bucket_name, local_files, prefix)
+
+
+def publish_data_version(bucket_name, s3_client=None):
+    """Publish a version of the uploaded data for query result caches.
+
+    The version is a hash of the key and MD5 of every uploaded object, so it
+    changes whenever a partition is added, rewritten or removed.
+    """
+    s3_client = s3_client or get_s3_client()
+    manifest = load_manifest()
+    digest = hashlib.sha256()
+    for key in sorted(manifest):
+        digest.update(f"{key}:{manifest[key]['md5']}\n".encode())
+
+    version = {'version': digest.hexdigest(),
+               'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+    s3_client.put_object(Bucket=bucket_name, Key=DATA_VERSION_KEY,
+                         Body=json.dumps(version), ContentType='application/json')
+    print(f"✓ Published data version {version['version'][:12]}")
+    return version['version']
+
+
+def download_state_files(bucket_name, state_files, s3_client=None):
+    """Restore the pipeline's state files from S3 over their local copies.
+
+    state_files maps each local path to its key. A key not on S3 yet is
+    skipped, leaving the local file, if any, to be used or rebuilt.
+    """
+    s3_client = s3_client or get_s3_client()
+    for path, key in state_files.items():
+        try:
+            body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        print(f"✓ Restored {path} from s3://{bucket_name}/{key}")
+
+
+def upload_state_files(bucket_name, state_files, s3_client=None):
+    """Save the pipeline's state files to S3, so the next run starts from them on a fresh disk."""
+    s3_client = s3_client or get_s3_client()
+    for path, key in state_files.items():
+        if os.path.exists(path):
+            s3_client.upload_file(path, bucket_name, key)
+            print(f"✓ Saved {path} to s3://{bucket_name}/{key}")
+
 
+def upload_to_s3(partitions=None):
+    """Main upload pipeline.
 
-def upload_to_s3():
-    """Main upload pipeline."""
+    With a list of partition keys, only those transaction partitions are
+    re-pushed; the rollup and dimension tables are always synced. Uploaded
+    partitions are published in the Glue catalog before the new data
+    version is, so they are queryable once caches invalidate.
+    """
     bucket_name = get_bucket_name()
-    upload_time_partitioned_data(bucket_name)
-    upload_dimension_tables(bucket_name)
+    s3_client = get_s3_client()
+    upload_time_partitioned_data(bucket_name, s3_client, partitions)
+    upload_rollup_data(bucket_name, s3_client)
+    upload_dimension_tables(bucket_name, s3_client)
+    publish_data_version(bucket_name, s3_client)
     print(f"\n✓ Upload complete: s3://{bucket_name}/")
 
 
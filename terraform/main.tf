@@ -62,13 +62,90 @@ resource "aws_glue_catalog_database" "t3_data_lake_db" {
   name = "c21_nathan_t3_food_trucks_db"
 }
 
-resource "aws_glue_crawler" "transactions_crawler" {
-  name          = "c21-nathan-t3-transactions-crawler"
+# Transaction partitions live in per-write generation folders that the
+# pipeline points the catalog at, so the table is defined here rather than
+# crawled: a crawler would read the generation folders as partitions.
+resource "aws_glue_catalog_table" "transactions" {
+  name          = "transactions"
+  database_name = aws_glue_catalog_database.t3_data_lake_db.name
+  table_type    = "EXTERNAL_TABLE"
+
+  parameters = {
+    classification = "parquet"
+  }
+
+  storage_descriptor {
+    location      = "s3://${aws_s3_bucket.data_lake.id}/inputs/transactions/"
+    input_format  = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+    output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
+
+    ser_de_info {
+      serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+    }
+
+    columns {
+      name = "transaction_id"
+      type = "int"
+    }
+    columns {
+      name = "truck_id"
+      type = "int"
+    }
+    columns {
+      name = "payment_method_id"
+      type = "int"
+    }
+    columns {
+      name = "total"
+      type = "int"
+    }
+    columns {
+      name = "at"
+      type = "timestamp"
+    }
+    columns {
+      name = "truck_name"
+      type = "string"
+    }
+    columns {
+      name = "truck_description"
+      type = "string"
+    }
+    columns {
+      name = "has_card_reader"
+      type = "tinyint"
+    }
+    columns {
+      name = "fsa_rating"
+      type = "tinyint"
+    }
+    columns {
+      name = "payment_method"
+      type = "string"
+    }
+  }
+
+  partition_keys {
+    name = "year"
+    type = "string"
+  }
+  partition_keys {
+    name = "month"
+    type = "string"
+  }
+  partition_keys {
+    name = "day"
+    type = "string"
+  }
+}
+
+resource "aws_glue_crawler" "rollup_crawler" {
+  name          = "c21-nathan-t3-rollup-crawler"
   role          = aws_iam_role.glue_crawler_role.arn
   database_name = aws_glue_catalog_database.t3_data_lake_db.name
 
   s3_target {
-    path = "s3://${aws_s3_bucket.data_lake.id}/inputs/transactions/"
+    path = "s3://${aws_s3_bucket.data_lake.id}/inputs/rollup/"
   }
 }
 
@@ -86,8 +163,8 @@ output "glue_database_name" {
   value = aws_glue_catalog_database.t3_data_lake_db.name
 }
 
-output "glue_crawler_transactions" {
-  value = aws_glue_crawler.transactions_crawler.name
+output "glue_crawler_rollup" {
+  value = aws_glue_crawler.rollup_crawler.name
 }
 
 output "glue_crawler_dimensions" {
@@ -210,6 +287,8 @@ resource "aws_iam_role_policy" "ecs_task_glue_athena_policy" {
           "glue:GetDatabase",
           "glue:GetTable",
           "glue:GetPartitions",
+          "glue:BatchCreatePartition",
+          "glue:BatchUpdatePartition",
           "athena:StartQueryExecution",
           "athena:GetQueryExecution",
           "athena:GetQueryResults"
@@ -259,6 +338,10 @@ resource "aws_ecs_task_definition" "etl_pipeline" {
           name  = "S3_BUCKET_NAME"
           value = aws_s3_bucket.data_lake.id
         },
+        {
+          name  = "ATHENA_DATABASE"
+          value = aws_glue_catalog_database.t3_data_lake_db.name
+        },
         {
           name  = "AWS_DEFAULT_REGION"
           value = var.aws_region
@@ -444,6 +527,7 @@ resource "aws_iam_role_policy" "lambda_report" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
+          "s3:DeleteObject",
           "s3:ListBucket",
           "s3:GetBucketLocation",
           "s3:GetBucketVersioning"
@@ -0,0 +1,57 @@
+"""Put the pipeline, dashboard and daily report modules on the import path, as each runs from its own directory."""
+import os
+import sys
+import importlib.util
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+for component in ['pipeline', 'dashboard', 'daily report']:
+    sys.path.insert(0, str(ROOT / component))
+
+
+@pytest.fixture
+def generate_report():
+    """Import a fresh copy of the daily report's generate_report.py."""
+    spec = importlib.util.spec_from_file_location(
+        'generate_report', ROOT / 'daily report' / 'generate_report.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def source_db(tmp_path, monkeypatch):
+    """Run the pipeline in tmp_path against a SQLite stand-in for RDS and moto S3.
+
+    The source starts with 1000 transactions from 2026-01-04; the fixture
+    yields the path of its database.
+    """
+    import boto3
+    from moto import mock_aws
+    import extract
+    from sqlite_source import SQLiteConnection, create_source_db, make_transactions
+
+    path = tmp_path / 'source.db'
+    create_source_db(path, make_transactions(1, 1000, '2026-01-04'))
+    (tmp_path / 'data/raw').mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    environment = {
+        'EXTRACT_MODE': 'full',
+        'EXTRACT_STREAMING': 'false',
+        'EXTRACT_WORKERS': '1',
+        'EXTRACT_BATCH_SIZE': '300',
+        'PIPELINE_PERSIST_CSV': 'false',
+        'PIPELINE_METRICS_PATH': str(tmp_path / 'metrics.jsonl'),
+        'GLUE_REGISTER_PARTITIONS': 'false',
+        'S3_BUCKET_NAME': 'test-bucket',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing'
+    }
+    with mock.patch.dict(os.environ, environment), mock_aws(), \
+            mock.patch.object(extract, 'get_db_connection', lambda: SQLiteConnection(path)):
+        boto3.client('s3').create_bucket(Bucket='test-bucket')
+        yield path
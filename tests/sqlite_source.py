@@ -0,0 +1,98 @@
+"""
+A SQLite stand-in for the RDS MySQL source, for running the pipeline in tests.
+Accepts the MySQL-flavoured SQL extract.py issues: %s placeholders and
+CHECKSUM TABLE.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+
+TABLE_COLUMNS = {
+    'DIM_Truck': ('truck_id INT PRIMARY KEY, truck_name VARCHAR(255), '
+                  'truck_description VARCHAR(255), has_card_reader SMALLINT, '
+                  'fsa_rating SMALLINT'),
+    'DIM_Payment_Method': 'payment_method_id INT PRIMARY KEY, payment_method VARCHAR(50)',
+    'FACT_Transaction': ('transaction_id INT PRIMARY KEY, truck_id INT, '
+                         'payment_method_id INT, total DOUBLE, at DATETIME')
+}
+DIMENSIONS = {
+    'DIM_Truck': pd.DataFrame({
+        'truck_id': [1, 2], 'truck_name': ['Burrito Madness', 'Kings of Kebabs'],
+        'truck_description': ['Burritos', 'Kebabs'], 'has_card_reader': [1, 0],
+        'fsa_rating': [4, 2]}),
+    'DIM_Payment_Method': pd.DataFrame({
+        'payment_method_id': [1, 2], 'payment_method': ['cash', 'card']})
+}
+
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """A SQLite cursor that accepts the SQL extract.py issues."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, query, params=None):
+        if query.startswith('CHECKSUM TABLE'):
+            table = query.split()[-1]
+            query = f"SELECT '{table}', COUNT(*) || ':' || MAX(rowid) FROM {table}"
+        return self.cursor.execute(query.replace('%s', '?'), params or ())
+
+
+class SQLiteConnection:
+    """A SQLite connection standing in for the pymysql connection extract.py expects."""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                          check_same_thread=False)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self.connection.cursor())
+
+
+def make_transactions(first_id, count, start):
+    """Make count transactions 17 minutes apart from start."""
+    ids = range(first_id, first_id + count)
+    return pd.DataFrame({
+        'transaction_id': list(ids),
+        'truck_id': [i % 2 + 1 for i in ids],
+        'payment_method_id': [i % 3 % 2 + 1 for i in ids],
+        'total': [float(500 + i % 7 * 100) for i in ids],
+        'at': pd.Timestamp(start) + pd.to_timedelta([17 * n for n in range(count)], unit='min')
+    })
+
+
+def insert_rows(path, table, df):
+    """Insert a DataFrame's rows into a table of the source database."""
+    if 'at' in df:
+        df = df.assign(at=df['at'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    columns = ', '.join(df.columns)
+    values = ', '.join(['?'] * len(df.columns))
+    with closing(sqlite3.connect(path)) as connection:
+        connection.executemany(f"INSERT INTO {table} ({columns}) VALUES ({values})",
+                               df.astype(object).itertuples(index=False, name=None))
+        connection.commit()
+
+
+def create_source_db(path, transactions):
+    """Create the source tables, with two trucks, two payment methods and the given transactions."""
+    with closing(sqlite3.connect(path)) as connection:
+        for table, columns in TABLE_COLUMNS.items():
+            connection.execute(f"CREATE TABLE {table} ({columns})")
+    for table, df in DIMENSIONS.items():
+        insert_rows(path, table, df)
+    insert_rows(path, 'FACT_Transaction', transactions)
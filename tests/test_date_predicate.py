@@ -0,0 +1,91 @@
+"""
+Check that build_date_predicate prunes the rollup's year/month/day partitions.
+Out-of-range files are written as bytes that are not Parquet, so a query
+only succeeds if DuckDB never opens them. The first file stays valid, as
+DuckDB reads its schema before pruning, and EXPLAIN ANALYZE's file count
+shows it is not scanned.
+"""
+import re
+import inspect
+from datetime import date, timedelta
+
+import duckdb
+import pytest
+import queries
+
+DAYS = [date(2023, 12, 30) + timedelta(days=i) for i in range(40)]
+
+
+def write_day_partitions(data_dir, days, keep):
+    """Write one file per day partition, corrupting those of days outside keep but the first."""
+    connection = duckdb.connect()
+    for i, day in enumerate(days):
+        partition_dir = data_dir / f"year={day:%Y}" / f"month={day:%m}" / f"day={day:%d}"
+        partition_dir.mkdir(parents=True)
+        path = partition_dir / 'rollup.parquet'
+        if day in keep or i == 0:
+            connection.execute(f"""
+            COPY (SELECT DATE '{day.isoformat()}' AS transaction_date, 1 AS transaction_count)
+            TO '{path}' (FORMAT parquet)
+            """)
+        else:
+            path.write_bytes(b'not a parquet file')
+
+
+def build_query(data_dir, predicate):
+    """Build a query reading the partitions as the local backend does."""
+    return f"""
+    SELECT transaction_date FROM read_parquet(
+        '{data_dir}/year=*/month=*/day=*/*.parquet',
+        hive_partitioning = true,
+        hive_types = {{'year': VARCHAR, 'month': VARCHAR, 'day': VARCHAR}})
+    WHERE {predicate}
+    ORDER BY transaction_date
+    """
+
+
+def query_days(data_dir, predicate):
+    """Return the days the predicate selects."""
+    return [row[0] for row in duckdb.sql(build_query(data_dir, predicate)).fetchall()]
+
+
+def count_scanned_files(data_dir, predicate):
+    """Return how many files DuckDB scans for the predicate, and of how many."""
+    plan = duckdb.sql(f"EXPLAIN ANALYZE {build_query(data_dir, predicate)}").fetchall()[0][1]
+    scanned, total = re.search(r'Scanning Files: (\d+)/(\d+)', plan).groups()
+    return int(scanned), int(total)
+
+
+@pytest.mark.parametrize('start,end', [
+    (date(2023, 12, 31), date(2024, 1, 2)),
+    (date(2024, 1, 30), date(2024, 2, 2)),
+    (date(2024, 1, 5), date(2024, 1, 5)),
+    (date(2024, 2, 5), None),
+    (None, date(2024, 1, 1))
+])
+def test_predicate_reads_only_partitions_in_range(tmp_path, start, end):
+    keep = [day for day in DAYS if (start is None or day >= start) and (end is None or day <= end)]
+    write_day_partitions(tmp_path, DAYS, keep)
+
+    predicate = queries.build_date_predicate(start, end)
+    assert query_days(tmp_path, predicate) == keep
+    assert count_scanned_files(tmp_path, predicate) == (len(keep), len(DAYS))
+
+
+def test_date_column_filter_alone_opens_every_partition(tmp_path):
+    day = date(2024, 1, 5)
+    write_day_partitions(tmp_path, DAYS, [day])
+
+    with pytest.raises(duckdb.Error):
+        query_days(tmp_path, f"transaction_date = DATE '{day.isoformat()}'")
+
+
+def test_report_copy_matches_dashboard_builder(generate_report):
+    report = generate_report
+
+    for name in ['partition_bound', 'build_date_predicate']:
+        dashboard_body = inspect.getsource(getattr(queries, name)).split('"""')[2]
+        report_body = inspect.getsource(getattr(report, name)).split('"""')[2]
+        assert report_body == dashboard_body, f"{name} differs between the dashboard and the report"
+    for start, end in [(DAYS[0], DAYS[-1]), (DAYS[3], DAYS[3]), (DAYS[5], None), (None, DAYS[5])]:
+        assert report.build_date_predicate(start, end) == queries.build_date_predicate(start, end)
@@ -0,0 +1,16 @@
+"""Transactions already in the landed id index must be dropped and counted in telemetry."""
+import pandas as pd
+from landed_ids import add_ids, empty_index
+from telemetry import stage_metrics
+from transform import drop_landed
+
+
+def test_dropped_landed_rows_are_counted(monkeypatch):
+    monkeypatch.setenv('PIPELINE_METRICS_FORMAT', 'off')
+    transactions = pd.DataFrame({'transaction_id': [2, 3, 4], 'total': [9.5, 6.0, 7.0]})
+
+    with stage_metrics('transform') as metrics:
+        kept = drop_landed(transactions, add_ids(empty_index(), [1, 2, 3]))
+
+    assert kept['transaction_id'].tolist() == [4]
+    assert metrics['rows_skipped'] == 2
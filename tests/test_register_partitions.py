@@ -0,0 +1,124 @@
+"""Partition registration against moto's Glue mock."""
+import os
+from unittest import mock
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_aws
+import register_partitions
+import upload_to_s3
+
+DATABASE = 'food_trucks'
+BUCKET = 'test-bucket'
+
+
+@pytest.fixture
+def glue_client():
+    """A moto Glue client with an empty database."""
+    environment = {'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                   'AWS_SECRET_ACCESS_KEY': 'testing'}
+    with mock.patch.dict(os.environ, environment), mock_aws():
+        client = boto3.client('glue')
+        client.create_database(DatabaseInput={'Name': DATABASE})
+        yield client
+
+
+def create_table(glue_client, table):
+    """Create a parquet table partitioned by string year, month and day."""
+    glue_client.create_table(DatabaseName=DATABASE, TableInput={
+        'Name': table,
+        'StorageDescriptor': {
+            'Columns': [{'Name': 'total', 'Type': 'int'}],
+            'Location': f's3://{BUCKET}/inputs/{table}/',
+            'SerdeInfo': {'SerializationLibrary':
+                          'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}},
+        'PartitionKeys': [{'Name': name, 'Type': 'string'} for name in ['year', 'month', 'day']]})
+
+
+def get_locations(glue_client, table):
+    """Map each registered partition's values to its location."""
+    paginator = glue_client.get_paginator('get_partitions')
+    return {tuple(partition['Values']): partition['StorageDescriptor']['Location']
+            for page in paginator.paginate(DatabaseName=DATABASE, TableName=table)
+            for partition in page['Partitions']}
+
+
+def make_locations(days, generation):
+    """Map day partitions of January 2026 to directories of a generation."""
+    return {f'year=2026/month=01/day={day:02d}':
+            f'inputs/transactions/_generations/year=2026/month=01/day={day:02d}/{generation}/'
+            for day in days}
+
+
+def test_register_creates_partitions(glue_client):
+    create_table(glue_client, 'transactions')
+
+    register_partitions.register_partitions(
+        glue_client, DATABASE, 'transactions', BUCKET, make_locations([1, 2], 'g1'))
+
+    assert get_locations(glue_client, 'transactions') == {
+        ('2026', '01', f'{day:02d}'):
+            f's3://{BUCKET}/inputs/transactions/_generations/year=2026/month=01/day={day:02d}/g1/'
+        for day in [1, 2]}
+
+
+def test_register_moves_existing_partitions(glue_client, capsys):
+    create_table(glue_client, 'transactions')
+    register_partitions.register_partitions(
+        glue_client, DATABASE, 'transactions', BUCKET, make_locations([1, 2], 'g1'))
+
+    register_partitions.register_partitions(
+        glue_client, DATABASE, 'transactions', BUCKET, make_locations([2, 3], 'g2'))
+
+    locations = get_locations(glue_client, 'transactions')
+    assert [location.split('/')[-2] for _, location in sorted(locations.items())] == ['g1', 'g2', 'g2']
+    assert '✓ Registered 1 new transactions partitions (1 updated)' in capsys.readouterr().out
+
+
+def test_register_batches_calls(glue_client):
+    create_table(glue_client, 'transactions')
+    days = pd.date_range('2026-01-01', periods=250)
+    locations = {f'year={day:%Y}/month={day:%m}/day={day:%d}':
+                 f'inputs/transactions/year={day:%Y}/month={day:%m}/day={day:%d}/' for day in days}
+
+    with mock.patch.object(glue_client, 'batch_create_partition',
+                           wraps=glue_client.batch_create_partition) as create, \
+            mock.patch.object(glue_client, 'batch_update_partition',
+                              wraps=glue_client.batch_update_partition) as update:
+        register_partitions.register_partitions(
+            glue_client, DATABASE, 'transactions', BUCKET, locations)
+        register_partitions.register_partitions(
+            glue_client, DATABASE, 'transactions', BUCKET, locations)
+
+    assert [len(call.kwargs['PartitionInputList']) for call in create.call_args_list] == [100, 100, 50] * 2
+    assert [len(call.kwargs['Entries']) for call in update.call_args_list] == [100, 100, 50]
+    assert len(get_locations(glue_client, 'transactions')) == 250
+
+
+def test_register_skips_table_not_in_catalog(glue_client, capsys):
+    register_partitions.register_partitions(
+        glue_client, DATABASE, 'transactions', BUCKET, make_locations([1], 'g1'))
+
+    assert 'Skipped registering transactions partitions' in capsys.readouterr().out
+
+
+def test_rollup_partitions_registered_after_failed_registration(glue_client, tmp_path, monkeypatch):
+    create_table(glue_client, 'rollup')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ATHENA_DATABASE', DATABASE)
+    monkeypatch.setenv('GLUE_REGISTER_PARTITIONS', 'true')
+    partition_dir = tmp_path / 'data/rollup/year=2026/month=01/day=04'
+    partition_dir.mkdir(parents=True)
+    pd.DataFrame({'total': [1]}).to_parquet(partition_dir / 'rollup-0.parquet')
+    s3_client = boto3.client('s3')
+    s3_client.create_bucket(Bucket=BUCKET)
+
+    with mock.patch.object(glue_client, 'batch_create_partition',
+                           side_effect=RuntimeError('Glue unavailable')):
+        with pytest.raises(RuntimeError):
+            upload_to_s3.upload_rollup_data(BUCKET, s3_client, glue_client)
+    uploaded = upload_to_s3.upload_rollup_data(BUCKET, s3_client, glue_client)
+
+    assert uploaded == []
+    assert get_locations(glue_client, 'rollup') == {
+        ('2026', '01', '04'): f's3://{BUCKET}/inputs/rollup/year=2026/month=01/day=04/'}
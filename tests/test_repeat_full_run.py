@@ -0,0 +1,53 @@
+"""A full run over unchanged source data must keep the published partitions and upload nothing."""
+import os
+from pathlib import Path
+import boto3
+import pytest
+import pipeline
+import upload_to_s3
+from compact_parquet import get_partition_fingerprint
+from sqlite_source import insert_rows, make_transactions
+
+
+def list_transaction_keys():
+    """List the transaction objects on S3."""
+    return sorted(upload_to_s3.list_remote_etags(
+        boto3.client('s3'), 'test-bucket', 'inputs/transactions/'))
+
+
+def get_fingerprints():
+    """Get the fingerprint of every local partition."""
+    return {str(partition_dir): get_partition_fingerprint(partition_dir)
+            for partition_dir in sorted(Path('data/parquet').glob('year=*/month=*/day=*'))}
+
+
+@pytest.mark.parametrize('pipelined', ['false', 'true'])
+def test_repeated_full_run_uploads_no_transactions(source_db, capsys, pipelined):
+    os.environ['PIPELINE_PIPELINED'] = pipelined
+    pipeline.run_pipeline()
+    keys, fingerprints = list_transaction_keys(), get_fingerprints()
+    capsys.readouterr()
+
+    pipeline.run_pipeline()
+
+    uploads = [line for line in capsys.readouterr().out.splitlines()
+               if line.startswith('✓ Uploaded inputs/transactions/')]
+    assert uploads == []
+    assert list_transaction_keys() == keys
+    assert get_fingerprints() == fingerprints
+
+
+def test_full_run_republishes_only_changed_partitions(source_db, capsys):
+    pipeline.run_pipeline()
+    fingerprints = get_fingerprints()
+    insert_rows(source_db, 'FACT_Transaction', make_transactions(1001, 1, '2026-01-05 12:00'))
+    capsys.readouterr()
+
+    pipeline.run_pipeline()
+
+    uploads = [line for line in capsys.readouterr().out.splitlines()
+               if line.startswith('✓ Uploaded inputs/transactions/')]
+    changed = {partition for partition, fingerprint in get_fingerprints().items()
+               if fingerprints[partition] != fingerprint}
+    assert changed == {'data/parquet/year=2026/month=01/day=05'}
+    assert uploads and all('/day=05/' in line for line in uploads)
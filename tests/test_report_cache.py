@@ -0,0 +1,26 @@
+"""
+Check that the daily report's result cache stays apart from the dashboard's.
+"""
+import boto3
+from moto import mock_aws
+
+BUCKET = 'food-trucks-test'
+
+
+@mock_aws
+def test_report_eviction_leaves_dashboard_entries(monkeypatch, generate_report):
+    monkeypatch.setenv('S3_BUCKET_NAME', BUCKET)
+    monkeypatch.setenv('REPORT_CACHE_MAX_MB', '0')
+    report = generate_report
+    s3_client = boto3.client('s3', region_name='us-east-1')
+    s3_client.create_bucket(Bucket=BUCKET)
+    s3_client.put_object(Bucket=BUCKET, Key='cache/queries/dashboard.parquet', Body=b'x' * 100)
+    results = {'columns': ['n'], 'types': ['integer'], 'rows': [['1']]}
+    monkeypatch.setattr(report, 'execute_athena_query', lambda *args: results)
+
+    config = report.get_config()
+    rows = report.run_cached_query('SELECT 1 AS n', {'s3': s3_client, 'athena': None}, config, 'v1')
+
+    assert rows == [{'n': 1}]
+    keys = [obj['Key'] for obj in s3_client.list_objects_v2(Bucket=BUCKET)['Contents']]
+    assert keys == ['cache/queries/dashboard.parquet']
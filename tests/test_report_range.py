@@ -0,0 +1,27 @@
+"""
+Check that the report Lambda rejects bad date ranges before querying Athena.
+"""
+import pytest
+
+
+@pytest.mark.parametrize('event', [
+    {'start_date': '2026-01-31', 'end_date': '2026-01-01'},
+    {'start_date': '2026-02-30'},
+    {'start_date': '2026-01-01', 'end_date': "2026-01-02' OR 1=1 --"}
+])
+def test_bad_range_returns_400_without_querying(monkeypatch, generate_report, event):
+    def fail():
+        raise AssertionError('queried AWS for an invalid range')
+    monkeypatch.setattr(generate_report, 'get_aws_clients', fail)
+
+    response = generate_report.lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+    assert response['message'] == 'Invalid report date range'
+
+
+def test_range_defaults_to_one_day(generate_report):
+    yesterday = generate_report.get_yesterday_date()
+
+    assert generate_report.resolve_report_range() == (yesterday, yesterday)
+    assert generate_report.resolve_report_range('2026-01-05') == ('2026-01-05', '2026-01-05')
@@ -0,0 +1,49 @@
+"""A batch retried after a failed upload must be counted once in the lake and the rollup."""
+import io
+import os
+from pathlib import Path
+from unittest import mock
+import boto3
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+import pipeline
+import upload_to_s3
+from sqlite_source import insert_rows, make_transactions
+
+BUCKET = 'test-bucket'
+
+
+def count_uploaded_rows():
+    """Count the rows in the transaction objects on S3."""
+    s3_client = boto3.client('s3')
+    keys = upload_to_s3.list_remote_etags(s3_client, BUCKET, 'inputs/transactions/')
+    return sum(pq.read_metadata(io.BytesIO(
+        s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read())).num_rows
+        for key in keys if key.endswith('.parquet'))
+
+
+@pytest.mark.parametrize('pipelined', ['false', 'true'])
+def test_retried_batch_is_counted_once(source_db, pipelined):
+    os.environ['PIPELINE_PIPELINED'] = pipelined
+    pipeline.run_pipeline()
+
+    insert_rows(source_db, 'FACT_Transaction', make_transactions(1001, 50, '2026-01-04 06:00'))
+
+    os.environ['EXTRACT_MODE'] = 'incremental'
+    with mock.patch.object(upload_to_s3, 'upload_rollup_data',
+                           side_effect=RuntimeError('S3 unavailable')):
+        with pytest.raises(pipeline.PipelineStageError):
+            pipeline.run_pipeline()
+    pipeline.run_pipeline()
+
+    lake = ds.dataset([str(f) for f in Path('data/parquet').glob('year=*/month=*/day=*/*.parquet')],
+                      format='parquet').to_table(columns=['transaction_id', 'total'])
+    rollup = ds.dataset('data/rollup', format='parquet').to_table(
+        columns=['transaction_count', 'total_revenue'])
+    assert lake.num_rows == 1050
+    assert len(pc.unique(lake['transaction_id'])) == 1050
+    assert pc.sum(rollup['transaction_count']).as_py() == 1050
+    assert pc.sum(rollup['total_revenue']).as_py() == pc.sum(lake['total']).as_py()
+    assert count_uploaded_rows() == 1050
@@ -0,0 +1,39 @@
+"""The pipeline's state must survive a run on a fresh disk, as every ECS task starts with one."""
+import os
+import shutil
+import boto3
+import pipeline
+import upload_to_s3
+from extract import STATE_KEY, load_extract_state
+from landed_ids import INDEX_KEY, is_landed, load_landed_ids
+
+
+def test_landed_id_index_is_restored_from_s3(source_db, capsys):
+    pipeline.run_pipeline()
+    assert INDEX_KEY in upload_to_s3.list_remote_etags(
+        boto3.client('s3'), 'test-bucket', 'inputs/transactions/')
+    shutil.rmtree('data')
+    capsys.readouterr()
+
+    upload_to_s3.download_state_files('test-bucket', pipeline.STATE_FILES)
+    index = load_landed_ids()
+
+    assert '✓ Built landed id index' not in capsys.readouterr().out
+    assert is_landed(index, [1, 1000, 1001]).tolist() == [True, True, False]
+
+
+def test_extract_watermark_is_restored_from_s3(source_db):
+    pipeline.run_pipeline()
+    state = load_extract_state()
+    assert state['transaction_id'] == 1000
+    shutil.rmtree('data')
+
+    upload_to_s3.download_state_files('test-bucket', pipeline.STATE_FILES)
+
+    assert load_extract_state() == state
+    assert boto3.client('s3').head_object(Bucket='test-bucket', Key=STATE_KEY)
+
+
+def test_state_files_not_on_s3_are_skipped(source_db):
+    upload_to_s3.download_state_files('test-bucket', pipeline.STATE_FILES)
+    assert not any(os.path.exists(path) for path in pipeline.STATE_FILES)
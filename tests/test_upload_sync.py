@@ -0,0 +1,69 @@
+"""The uploader's skip-unchanged sync against moto S3."""
+import os
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+import upload_to_s3
+
+BUCKET = 'test-bucket'
+PREFIX = 'inputs/rollup/'
+
+
+@pytest.fixture
+def s3_client(tmp_path, monkeypatch):
+    """A moto S3 client with an empty bucket, with the upload manifest kept in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    environment = {'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                   'AWS_SECRET_ACCESS_KEY': 'testing'}
+    with mock.patch.dict(os.environ, environment), mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def write_files(tmp_path, contents):
+    """Write local files and map the key each is uploaded to to its path."""
+    local_files = {}
+    for name, body in contents.items():
+        path = tmp_path / 'data/rollup/year=2026/month=01/day=04' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        local_files[f'{PREFIX}year=2026/month=01/day=04/{name}'] = path
+    return local_files
+
+
+def test_sync_uploads_only_changed_files(s3_client, tmp_path):
+    local_files = write_files(tmp_path, {'a.parquet': b'a', 'b.parquet': b'b'})
+
+    assert sorted(upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX)) == sorted(local_files)
+    assert upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX) == []
+
+    local_files.update(write_files(tmp_path, {'b.parquet': b'b2'}))
+    assert upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX) == [
+        f'{PREFIX}year=2026/month=01/day=04/b.parquet']
+
+
+def test_sync_reuploads_when_remote_etag_changes(s3_client, tmp_path):
+    local_files = write_files(tmp_path, {'a.parquet': b'a'})
+    upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX)
+    key = next(iter(local_files))
+    s3_client.put_object(Bucket=BUCKET, Key=key, Body=b'changed elsewhere')
+
+    assert upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX) == [key]
+    assert s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read() == b'a'
+
+
+def test_sync_deletes_stale_objects(s3_client, tmp_path):
+    local_files = write_files(tmp_path, {'a.parquet': b'a', 'b.parquet': b'b'})
+    upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX)
+    stale_key = f'{PREFIX}year=2026/month=01/day=04/b.parquet'
+    del local_files[stale_key]
+    s3_client.put_object(Bucket=BUCKET, Key=f'{PREFIX}year=2026/month=01/day=05/c.parquet', Body=b'c')
+
+    upload_to_s3.sync_files(s3_client, BUCKET, local_files, PREFIX, delete_stale=True)
+
+    remote_keys = upload_to_s3.list_remote_etags(s3_client, BUCKET, PREFIX)
+    assert sorted(remote_keys) == [f'{PREFIX}year=2026/month=01/day=04/a.parquet',
+                                   f'{PREFIX}year=2026/month=01/day=05/c.parquet']
+    assert stale_key not in upload_to_s3.load_manifest()